@@ -1,14 +1,26 @@
+from typing import Optional
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from app.services.asrg_vuldb_service import ASRGVulnerabilityService
 
 router = APIRouter()
 
 @router.get("/fetch")
-async def fetch_cves(term: str):
+async def fetch_cves(term: str, incremental: bool = False):
     try:
-        result = await ASRGVulnerabilityService.fetch_and_index(term)
+        # Ingestion is blocking (requests + sync ES client): keep it off the event loop
+        sync = ASRGVulnerabilityService.sync_incremental if incremental else ASRGVulnerabilityService.fetch_and_index
+        result = await run_in_threadpool(sync, term)
         if "error" in result:
             raise HTTPException(status_code=404, detail=result["error"])
         return result
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/rollback")
+async def rollback_cves(term: str, version: Optional[str] = None):
+    """Point asrg-{term} back at a previous index version (default: the one before the live version)"""
+    result = await run_in_threadpool(ASRGVulnerabilityService.rollback, term, version)
+    if result["status"] != "success":
+        raise HTTPException(status_code=404, detail=result["message"])
+    return result
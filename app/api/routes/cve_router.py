@@ -1,16 +1,33 @@
+from elasticsearch.exceptions import NotFoundError
 from fastapi import APIRouter, Query, HTTPException
-from typing import Optional
-from app.services.cve_service import CVEService
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import List, Literal, Optional
+from app.models.cve_model import CVELookupRequest, CVELookupResponse, CVESearchResponse
+from app.services.cve_service import cve_service, COMPACT_FIELDS
+from app.services.export_service import export_cves
+from app.services.search_cache import search_result_cache
+from app.services.suggest_service import suggest_service
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/search")
-def search_cves(
+def _projection(fields: Optional[str], compact: bool) -> Optional[List[str]]:
+    """Source fields requested through the fields/compact query parameters"""
+    if fields:
+        return [field.strip() for field in fields.split(",") if field.strip()]
+    if compact:
+        return COMPACT_FIELDS
+    return None
+
+@router.get("/search", response_model=CVESearchResponse, response_class=ORJSONResponse)
+async def search_cves(
     q: str = Query(..., description="Search query - can be a CVE name (e.g., CVE-2024-55195) or keywords"),
     page: int = Query(1, ge=1, description="Page number (starts from 1)"),
-    page_size: int = Query(10, ge=1, le=100, description="Number of results per page (max 100)")
+    page_size: int = Query(10, ge=1, le=100, description="Number of results per page (max 100)"),
+    cursor: Optional[str] = Query(None, description="Cursor pagination: '*' for the first page, then the returned next_cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated source fields to return, e.g. name,cvss.baseScore"),
+    compact: bool = Query(False, description="Return only id, name, CVSS score/severity and created date")
 ):
     """
     Universal search endpoint that handles both CVE names and keyword searches with pagination
@@ -19,58 +36,74 @@ def search_cves(
         if not q or not q.strip():
             raise HTTPException(status_code=400, detail="Search query cannot be empty")
 
-        service = CVEService()
-        result = service.search(q.strip(), page=page, page_size=page_size)
+        result = await cve_service.search(
+            q.strip(), page=page, page_size=page_size, cursor=cursor,
+            fields=_projection(fields, compact)
+        )
         
-        return {
+        # Returned as a response so FastAPI skips re-validating and re-encoding ES documents
+        return ORJSONResponse({
             "count": len(result["results"]),
             "results": result["results"],
             "pagination": result["pagination"],
             "query": result["query"],
             "search_type": result["search_type"]
-        }
+        })
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in search_cves: {e}")
         raise HTTPException(status_code=500, detail="Internal server error occurred during search")
 
-@router.get("/browse")
-def browse_all_cves(
+@router.get("/browse", response_model=CVESearchResponse, response_class=ORJSONResponse)
+async def browse_all_cves(
     page: int = Query(1, ge=1, description="Page number (starts from 1)"),
-    page_size: int = Query(10, ge=1, le=100, description="Number of results per page (max 100)")
+    page_size: int = Query(10, ge=1, le=100, description="Number of results per page (max 100)"),
+    cursor: Optional[str] = Query(None, description="Cursor pagination: '*' for the first page, then the returned next_cursor"),
+    fields: Optional[str] = Query(None, description="Comma-separated source fields to return, e.g. name,cvss.baseScore"),
+    compact: bool = Query(False, description="Return only id, name, CVSS score/severity and created date")
 ):
     """
     Browse all CVEs with pagination - useful for getting all CVEs without search query
     """
     try:
-        service = CVEService()
-        result = service.get_all_cves(page=page, page_size=page_size)
+        result = await cve_service.get_all_cves(
+            page=page, page_size=page_size, cursor=cursor,
+            fields=_projection(fields, compact)
+        )
         
-        return {
+        return ORJSONResponse({
             "count": len(result["results"]),
             "results": result["results"],
             "pagination": result["pagination"],
             "query": "all",
             "search_type": "browse_all"
-        }
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error in browse_all_cves: {e}")
         raise HTTPException(status_code=500, detail="Internal server error occurred during browse")
 
 # Keep the old endpoint for backward compatibility
 @router.get("/search-legacy")
-def search_cves_legacy(
+async def search_cves_legacy(
     name: Optional[str] = Query(None, description="Exact CVE name like CVE-2021-42718"),
-    keyword: Optional[str] = Query(None, description="Keyword to search in description")
+    keyword: Optional[str] = Query(None, description="Keyword to search in description"),
+    fields: Optional[str] = Query(None, description="Comma-separated source fields to return, e.g. name,cvss.baseScore"),
+    compact: bool = Query(False, description="Return only id, name, CVSS score/severity and created date")
 ):
     """Legacy search endpoint with separate name and keyword parameters"""
     try:
         if not name and not keyword:
             raise HTTPException(status_code=400, detail="You must provide either 'name' or 'keyword'")
 
-        service = CVEService()
-        results = service.search_cve(name=name, keyword=keyword)
+        results = await cve_service.search_cve(
+            name=name, keyword=keyword,
+            fields=_projection(fields, compact)
+        )
         
         return {
             "count": len(results), 
@@ -85,3 +118,85 @@ def search_cves_legacy(
     except Exception as e:
         logger.error(f"Error in search_cves_legacy: {e}")
         raise HTTPException(status_code=500, detail="Internal server error occurred during search")
+
+@router.post("/lookup", response_model=CVELookupResponse, response_class=ORJSONResponse)
+async def lookup_cves(
+    request: CVELookupRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated source fields to return, e.g. name,cvss.baseScore"),
+    compact: bool = Query(False, description="Return only id, name, CVSS score/severity and created date")
+):
+    """
+    Resolve a list of CVE IDs (e.g. from an SBOM scan) in a single request
+    """
+    try:
+        result = await cve_service.lookup(request.ids, fields=_projection(fields, compact))
+        return ORJSONResponse({
+            "count": len(result["found"]),
+            "results": result["found"],
+            "missing": result["missing"],
+            "invalid": result["invalid"]
+        })
+    except Exception as e:
+        logger.error(f"Error in lookup_cves: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error occurred during lookup")
+
+@router.get("/suggest")
+async def suggest_cves(
+    q: str = Query(..., min_length=1, description="Prefix typed so far, e.g. CVE-2024-55 or merc"),
+    limit: int = Query(10, ge=1, le=25, description="Maximum number of suggestions")
+):
+    """
+    Typeahead suggestions for CVE IDs and keywords, served from an in-memory prefix index
+    """
+    try:
+        return {"query": q, "suggestions": await suggest_service.suggest(q, limit=limit)}
+    except Exception as e:
+        logger.error(f"Error in suggest_cves: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error occurred during suggest")
+
+@router.get("/export")
+async def export_cves_endpoint(
+    q: Optional[str] = Query(None, description="Optional search query, same syntax as /search"),
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Export format"),
+    fields: Optional[str] = Query(None, description="Comma-separated source fields to export"),
+    compact: bool = Query(False, description="Export only id, name, CVSS score/severity and created date")
+):
+    """
+    Stream every matching CVE as a gzip-compressed NDJSON or CSV file
+    """
+    # Open the point in time before the response starts, so failures still get a status code
+    try:
+        pit_id = await cve_service.open_pit()
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail=f"Index '{cve_service.index_name}' does not exist")
+    except Exception as e:
+        logger.error(f"Error in export_cves: {e}")
+        raise HTTPException(status_code=503, detail="Search backend unavailable, try again later")
+
+    filename = f"{cve_service.index_name}.{format}.gz"
+    return StreamingResponse(
+        export_cves(q or "", export_format=format, fields=_projection(fields, compact), pit_id=pit_id),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/stats")
+async def cve_stats(
+    q: Optional[str] = Query(None, description="Optional search query, same syntax as /search"),
+    severity: Optional[str] = Query(None, description="Only count CVEs with this severity (e.g. HIGH)"),
+    sector: Optional[str] = Query(None, description="Only count CVEs tagged with this sector"),
+    top: int = Query(10, ge=1, le=50, description="Number of top sectors / authors to return")
+):
+    """
+    Severity counts, CVSS histogram, monthly trends and top sectors/authors in one request
+    """
+    try:
+        return await cve_service.stats(query=q, severity=severity, sector=sector, top=top)
+    except Exception as e:
+        logger.error(f"Error in cve_stats: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error occurred while computing statistics")
+
+@router.get("/cache/stats")
+def search_cache_stats():
+    """Hit/miss counters of the search result cache"""
+    return search_result_cache.stats()
@@ -1,49 +1,142 @@
 # app/api/ioc.py
-from fastapi import APIRouter
-from app.models.ioc_models import IOCRequest
-from app.services.otx_service import get_info_from_otx
-from app.services.virustotal_service import get_info_from_virustotal
-from app.core.elasticsearch_client import es
+import asyncio
+import orjson
+import shutil
+import tempfile
+from typing import List, Optional
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from app.models.ioc_models import IOCRequest, IOCBatchRequest, IOCAnalysisResponse, MAX_BATCH_IOCS
+from app.services.otx_service import get_info_from_otx, otx_singleflight
+from app.services.virustotal_service import get_info_from_virustotal, vt_singleflight
+from app.services.ioc_batch_service import analyze_batch
+from app.services.ioc_cache import ioc_cache
+from app.services.ioc_engine import aextract_iocs
+from app.services.ioc_utils import normalize_ioc
+from app.services.vt_scheduler import vt_scheduler
 
 router = APIRouter()
 
-@router.post("/analyze")
-def analyze_ioc(data: IOCRequest):
-    ioc_value = data.value.strip()
+UPLOAD_CHUNK_SIZE = 256 * 1024
 
-    # Prepare results dictionary
-    results = {
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+@router.post("/analyze", response_model=IOCAnalysisResponse, response_class=ORJSONResponse)
+async def analyze_ioc(
+    data: IOCRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated summary fields to return, e.g. detection_stats,reputation"),
+    full: bool = Query(False, description="Return the full upstream responses instead of the compact summaries")
+):
+    ioc_value = normalize_ioc(data.value)
+    selected = _parse_fields(fields)
+
+    # Both sources check their Elasticsearch cache and, on a miss, call the
+    # upstream API. Running them concurrently bounds a cold lookup by the
+    # slowest source instead of the sum of all round trips.
+    otx_result, vt_result = await asyncio.gather(
+        get_info_from_otx(ioc_value, full=full, fields=selected),
+        get_info_from_virustotal(ioc_value, full=full, fields=selected)
+    )
+
+    # Returned as a response so the (possibly full) upstream bodies are not re-validated and re-encoded
+    return ORJSONResponse({
         "ioc": ioc_value,
-        "otx": None,
-        "virustotal": None
-    }
+        "otx": otx_result,
+        "virustotal": vt_result
+    })
+
+@router.post("/analyze/batch")
+async def analyze_ioc_batch(
+    data: IOCBatchRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated summary fields to return"),
+    full: bool = Query(False, description="Return the full upstream responses instead of the compact summaries")
+):
+    """
+    Analyze a list of IOCs, streaming NDJSON lines as results complete: one line with the
+    cached sources of an IOC, then one line per source fetched upstream
+    """
+    selected = _parse_fields(fields)
 
-    # 1️⃣ Try to fetch from Elasticsearch first (both indexes in one go)
+    async def ndjson():
+        async for result in analyze_batch(data.values, full=full, fields=selected):
+            yield orjson.dumps(result) + b"\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.post("/extract")
+async def extract_iocs_from_file(
+    file: UploadFile = File(..., description="Threat report, log or CSV export to scan for IOCs"),
+    enrich: bool = Query(False, description="Also run every extracted IOC through batch analysis")
+):
+    """
+    Extract (and optionally enrich) IOCs from an uploaded file, streamed back as NDJSON
+    """
+    # FastAPI closes the upload as soon as this handler returns, before the
+    # response is streamed, so the response works from its own copy
+    upload = tempfile.TemporaryFile()
     try:
-        # OTX
-        otx_res = es.search(
-            index="otx-iocs",
-            body={"query": {"match": {"ioc": ioc_value}}}
-        )
-        if otx_res.get("hits", {}).get("total", {}).get("value", 0) > 0:
-            results["otx"] = otx_res["hits"]["hits"][0]["_source"]["raw"]
-
-        # VT
-        vt_res = es.search(
-            index="vt-iocs",
-            body={"query": {"match": {"ioc": ioc_value}}}
-        )
-        if vt_res.get("hits", {}).get("total", {}).get("value", 0) > 0:
-            results["virustotal"] = vt_res["hits"]["hits"][0]["_source"]["raw"]
-
-    except Exception:
-        pass  # If ES fails, just skip cache
-
-    # 2️⃣ Call APIs only if missing
-    if results["otx"] is None:
-        results["otx"] = get_info_from_otx(ioc_value)
-
-    if results["virustotal"] is None:
-        results["virustotal"] = get_info_from_virustotal(ioc_value)
-
-    return results
+        await run_in_threadpool(shutil.copyfileobj, file.file, upload, UPLOAD_CHUNK_SIZE)
+        upload.seek(0)
+    except BaseException:
+        upload.close()
+        raise
+
+    async def chunks():
+        while True:
+            data = await run_in_threadpool(upload.read, UPLOAD_CHUNK_SIZE)
+            if not data:
+                break
+            yield data
+
+    if not enrich:
+        async def ndjson():
+            try:
+                async for ioc in aextract_iocs(chunks()):
+                    yield orjson.dumps({"type": ioc.type, "value": ioc.value}) + b"\n"
+            finally:
+                upload.close()
+
+        # Closed once the response is done even if the stream was never iterated
+        # (client gone before the first chunk); the finally above covers a
+        # disconnect mid-stream, where the background task does not run
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson", background=BackgroundTask(upload.close))
+
+    # Enrichment is held to the same cap as /analyze/batch
+    try:
+        values = []
+        async for ioc in aextract_iocs(chunks()):
+            values.append(ioc.value)
+            if len(values) > MAX_BATCH_IOCS:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File contains more than {MAX_BATCH_IOCS} IOCs, split it or extract without enrich"
+                )
+    finally:
+        upload.close()
+
+    async def enriched():
+        async for result in analyze_batch(values):
+            yield orjson.dumps(result) + b"\n"
+
+    return StreamingResponse(enriched(), media_type="application/x-ndjson")
+
+@router.get("/cache/stats")
+def ioc_cache_stats():
+    """Hit/miss counters for the in-process (L1) and Redis (L2) IOC caches"""
+    return {
+        **ioc_cache.stats(),
+        "singleflight": {
+            "otx": otx_singleflight.stats(),
+            "virustotal": vt_singleflight.stats()
+        }
+    }
+
+@router.get("/vt/scheduler")
+def vt_scheduler_stats():
+    """Queue depth, wait times and quota counters of the VirusTotal scheduler"""
+    return vt_scheduler.stats()
@@ -7,6 +7,57 @@ class Settings(BaseSettings):
     redis_host: str
     otx_api_key: str
     virustotal_api_key: str
+
+    # Max number of IOCs enriched upstream at the same time by /api/ioc/analyze/batch, per source
+    ioc_batch_concurrency: int = 8
+    # Share of the VirusTotal daily quota one batch may spend; later IOCs get an error entry
+    ioc_batch_vt_quota_share: float = 0.2
+
+    # Replicas for the managed indices (the docker-compose cluster is single-node)
+    es_number_of_replicas: int = 0
+
+    # ASRG ingestion: documents per bulk request and bulk requests in flight
+    es_bulk_chunk_size: int = 500
+    es_bulk_workers: int = 4
+
+    # ASRG ingestion writes a new asrg-{term}-v<timestamp> index per run and swaps
+    # the asrg-{term} alias to it: previous versions kept for rollback, and the
+    # smallest new/live document ratio accepted before swapping (0 disables the check)
+    asrg_keep_versions: int = 2
+    asrg_min_doc_ratio: float = 0.5
+
+    # The ASRG feed is ordered by creation date, so incremental syncs only see new
+    # CVEs. Once the last full rebuild is this old (seconds), an incremental sync
+    # runs as a full one to pick up edited CVEs (rescoring, relevance); 0 = never
+    asrg_full_sync_interval: int = 86400
+
+    # Two-tier IOC result cache: in-process LRU (L1) and shared Redis (L2)
+    ioc_cache_l1_size: int = 1024
+    ioc_cache_l1_ttl: int = 300
+    ioc_cache_l2_ttl: int = 86400
+    ioc_cache_negative_ttl: int = 3600
+
+    # Coalesce identical concurrent upstream lookups across workers through Redis
+    ioc_singleflight_distributed: bool = True
+
+    # VirusTotal API quota, shared by all workers (public API: 4/min, 500/day)
+    vt_requests_per_minute: int = 4
+    vt_requests_per_day: int = 500
+
+    # Hot-IOC sweeper: every interval, re-enrich the top N most looked-up IOCs
+    # whose cache entry is past ioc_refresh_ahead of its TTL
+    ioc_sweep_interval: int = 900
+    ioc_sweep_top_n: int = 100
+    ioc_refresh_ahead: float = 0.8
+
+    # /api/search result cache, invalidated when ingestion bumps the index generation
+    search_cache_size: int = 2048
+    search_cache_ttl: int = 3600
+    search_stats_ttl: int = 60
+
+    # Ingestion snapshots loaded by the embedded (fallback) CVE search index
+    cve_snapshot_dir: str = "/tmp/cve-snapshots"
+
     class Config:
         env_file = ".env"
 
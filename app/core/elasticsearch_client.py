@@ -1,4 +1,4 @@
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, AsyncElasticsearch
 from app.core.config import settings
 
 es = Elasticsearch(
@@ -6,3 +6,10 @@ es = Elasticsearch(
     verify_certs=False,  # or True if using proper certs
     ssl_show_warn=False
 )
+
+# Async client for request handlers running on the event loop
+async_es = AsyncElasticsearch(
+    [settings.elastic_host],
+    verify_certs=False,
+    ssl_show_warn=False
+)
@@ -0,0 +1,150 @@
+import logging
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Refresh interval of bulk-loaded indices (ingestion disables refresh while loading, then restores this)
+BULK_REFRESH_INTERVAL = "30s"
+
+# Settings for indices that are rebuilt in bulk and read far more than written
+_BULK_LOADED_SETTINGS = {
+    "number_of_shards": 1,
+    "number_of_replicas": settings.es_number_of_replicas,
+    "refresh_interval": BULK_REFRESH_INTERVAL,
+}
+
+INDEX_TEMPLATES = {
+    "asrg-vulnerabilities": {
+        "index_patterns": ["asrg-*"],
+        "priority": 100,
+        "template": {
+            "settings": {
+                **_BULK_LOADED_SETTINGS,
+                # Browse and default listings are newest first
+                "sort.field": "created",
+                "sort.order": "desc",
+            },
+            "mappings": {
+                # Unmapped ASRG fields stay in _source without growing the mapping
+                "dynamic": False,
+                "properties": {
+                    "id": {"type": "keyword"},
+                    "name": {"type": "keyword", "fields": {"text": {"type": "text"}}},
+                    "description": {"type": "text"},
+                    "cvss": {
+                        "properties": {
+                            "baseScore": {"type": "float"},
+                            "baseSeverity": {"type": "keyword"},
+                            "vectorString": {"type": "keyword", "index": False},
+                        }
+                    },
+                    "createdBy": {"type": "keyword"},
+                    "created": {"type": "date"},
+                    "modified": {"type": "date"},
+                    "relevance": {"type": "boolean"},
+                    "sectors": {"type": "keyword"},
+                    "search_term": {"type": "keyword"},
+                    "timestamp": {"type": "date"},
+                    # Denormalized VicOne zero-day entries for this CVE
+                    "zero_day": {
+                        "properties": {
+                            "zero_day_id": {"type": "keyword"},
+                            "category": {"type": "keyword"},
+                            "impact": {"type": "keyword"},
+                        }
+                    },
+                },
+            },
+        },
+    },
+    "zeroday": {
+        "index_patterns": ["zeroday"],
+        "priority": 100,
+        "template": {
+            "settings": _BULK_LOADED_SETTINGS,
+            "mappings": {
+                "dynamic": False,
+                "properties": {
+                    "zero_day_id": {"type": "keyword"},
+                    "cve": {"type": "keyword"},
+                    "category": {"type": "keyword"},
+                    "impact": {"type": "keyword"},
+                },
+            },
+        },
+    },
+    "ingest-state": {
+        "index_patterns": ["ingest-state"],
+        "priority": 100,
+        "template": {
+            "settings": {
+                "number_of_shards": 1,
+                "number_of_replicas": settings.es_number_of_replicas,
+            },
+            "mappings": {
+                "dynamic": False,
+                "properties": {
+                    "watermark_created": {"type": "date"},
+                    "last_full_sync": {"type": "date"},
+                    "boundary_ids": {"type": "keyword"},
+                    "mode": {"type": "keyword"},
+                    "updated_at": {"type": "date"},
+                },
+            },
+        },
+    },
+    "ioc-cache": {
+        "index_patterns": ["vt-iocs", "otx-iocs"],
+        "priority": 100,
+        "template": {
+            "settings": {
+                "number_of_shards": 1,
+                "number_of_replicas": settings.es_number_of_replicas,
+            },
+            "mappings": {
+                "dynamic": False,
+                "properties": {
+                    "ioc": {"type": "keyword"},
+                    "type": {"type": "keyword"},
+                    "source": {"type": "keyword"},
+                    "fetched_at": {"type": "date"},
+                    "negative": {"type": "boolean"},
+                    "summary": {
+                        "properties": {
+                            "reputation": {"type": "integer"},
+                            "tags": {"type": "keyword"},
+                            "pulse_count": {"type": "integer"},
+                            "detection_stats": {
+                                "properties": {
+                                    "malicious": {"type": "integer"},
+                                    "suspicious": {"type": "integer"},
+                                }
+                            },
+                        }
+                    },
+                    # Full upstream bodies: stored, never indexed
+                    "raw": {"type": "object", "enabled": False},
+                    "raw_gz": {"type": "binary"},
+                },
+            },
+        },
+    },
+}
+
+
+async def ensure_index_templates(client) -> None:
+    """Create or update the managed index templates (AsyncElasticsearch client)."""
+    for name, body in INDEX_TEMPLATES.items():
+        try:
+            await client.indices.put_index_template(name=name, **body)
+        except Exception as e:
+            logger.error(f"Could not install index template '{name}': {e}")
+
+
+def ensure_index_templates_sync(client) -> None:
+    """Same as ensure_index_templates, for the blocking Elasticsearch client."""
+    for name, body in INDEX_TEMPLATES.items():
+        try:
+            client.indices.put_index_template(name=name, **body)
+        except Exception as e:
+            logger.error(f"Could not install index template '{name}': {e}")
@@ -0,0 +1,47 @@
+import logging
+import time
+import redis
+import redis.asyncio as redis_async
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# How long to stop talking to Redis after a failure, so an unreachable Redis
+# costs one timeout per window instead of one per request.
+REDIS_RETRY_AFTER = 30.0
+
+_disabled_until = 0.0
+
+
+def _build_client(module):
+    if settings.redis_host.startswith(("redis://", "rediss://", "unix://")):
+        return module.Redis.from_url(
+            settings.redis_host,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5
+        )
+    return module.Redis(
+        host=settings.redis_host,
+        port=6379,
+        socket_connect_timeout=0.5,
+        socket_timeout=0.5
+    )
+
+
+redis_client = _build_client(redis_async)
+
+# Blocking client for synchronous code such as the ingestion jobs
+sync_redis_client = _build_client(redis)
+
+
+def redis_available() -> bool:
+    """Return False while Redis is in its post-failure back-off window."""
+    return time.monotonic() >= _disabled_until
+
+
+def mark_redis_failure(exc: Exception) -> None:
+    """Record a Redis error and back off for REDIS_RETRY_AFTER seconds."""
+    global _disabled_until
+    if redis_available():
+        logger.warning(f"Redis unavailable, continuing without it for {REDIS_RETRY_AFTER:.0f}s: {exc}")
+    _disabled_until = time.monotonic() + REDIS_RETRY_AFTER
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.core.redis_client import redis_client, redis_available, mark_redis_failure
+
+logger = logging.getLogger(__name__)
+
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+_EXTEND_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("expire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution.
+
+    In-process, callers for a key that is already running await the same task.
+    With ``distributed=True`` a Redis lock extends this across workers: the
+    worker holding the lock runs the call, the others poll ``shared_result``
+    (typically the shared cache) until the leader's result shows up, the lock
+    is released, or ``wait_timeout`` passes, and only then run it themselves.
+    The leader keeps extending the lock while its call runs, however long that is.
+
+    Calls may carry a ``priority`` (lower is more urgent), stored in the lock: a
+    caller in another worker does not wait on a leader running at a lower
+    priority than its own and runs the call itself instead.
+    """
+
+    def __init__(self, namespace: str, distributed: bool = True,
+                 lock_ttl: int = 30, wait_timeout: float = 20.0, poll_interval: float = 0.1):
+        self.namespace = namespace
+        self.distributed = distributed
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.remote_hits = 0
+        self.overtaken = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]],
+                 shared_result: Optional[Callable[[], Awaitable[Any]]] = None,
+                 priority: Optional[int] = None) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._run(key, fn, shared_result, priority))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled caller does not cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> bool:
+        """Whether a call for ``key`` is running in this process (a do() now would join it)"""
+        return key in self._inflight
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]],
+                   shared_result: Optional[Callable[[], Awaitable[Any]]],
+                   priority: Optional[int]) -> Any:
+        if not self.distributed or shared_result is None or not redis_available():
+            return await self._execute(fn)
+
+        lock_key = f"singleflight:{self.namespace}:{key}"
+        # "<token>|<priority>", the token alone when the call has no priority
+        token = uuid.uuid4().hex if priority is None else f"{uuid.uuid4().hex}|{priority}"
+        try:
+            acquired = await redis_client.set(lock_key, token, nx=True, ex=self.lock_ttl)
+            leader = None if acquired else await redis_client.get(lock_key)
+        except Exception as e:
+            mark_redis_failure(e)
+            return await self._execute(fn)
+
+        if acquired:
+            keep_alive = asyncio.ensure_future(self._keep_alive(lock_key, token))
+            try:
+                return await self._execute(fn)
+            finally:
+                keep_alive.cancel()
+                try:
+                    await redis_client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    mark_redis_failure(e)
+
+        leader_priority = self._lock_priority(leader)
+        if priority is not None and leader_priority is not None and priority < leader_priority:
+            # The leader is queued behind more urgent work than this caller
+            self.overtaken += 1
+            return await self._execute(fn)
+
+        # Another worker is fetching: wait for its result to land in the shared cache
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        while loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await shared_result()
+            if result is not None:
+                self.remote_hits += 1
+                return result
+            try:
+                if not await redis_client.exists(lock_key):
+                    break
+            except Exception as e:
+                mark_redis_failure(e)
+                break
+
+        result = await shared_result()
+        if result is not None:
+            self.remote_hits += 1
+            return result
+        return await self._execute(fn)
+
+    async def _keep_alive(self, lock_key: str, token: str) -> None:
+        """Extend the lock held with ``token`` until cancelled, so a long call never loses it"""
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            try:
+                await redis_client.eval(_EXTEND_SCRIPT, 1, lock_key, token, self.lock_ttl)
+            except Exception as e:
+                mark_redis_failure(e)
+
+    @staticmethod
+    def _lock_priority(value: Any) -> Optional[int]:
+        """Priority of the leader from its lock value, or None if it has none (or the lock is gone)"""
+        if isinstance(value, bytes):
+            value = value.decode()
+        if not value or "|" not in value:
+            return None
+        return int(value.rsplit("|", 1)[1])
+
+    async def _execute(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.executed += 1
+        return await fn()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "remote_hits": self.remote_hits,
+            "overtaken": self.overtaken
+        }
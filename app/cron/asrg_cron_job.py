@@ -1,5 +1,11 @@
+import sys
 from app.services.asrg_vuldb_service import ASRGVulnerabilityService  
 
 if __name__ == "__main__":
-    result = ASRGVulnerabilityService.fetch_and_index("cve")
+    # Incremental by default: new CVEs only, plus a full rebuild whenever the last
+    # one is older than ASRG_FULL_SYNC_INTERVAL (edited CVEs). --full forces a rebuild
+    if "--full" in sys.argv[1:]:
+        result = ASRGVulnerabilityService.fetch_and_index("cve")
+    else:
+        result = ASRGVulnerabilityService.sync_incremental("cve")
     print(result)
@@ -1,8 +1,12 @@
 #!/bin/bash
 export PYTHONPATH="/home/coding/backend"
 export ELASTIC_HOST="http://localhost:9200"
-export REDIS_HOST="dummy"
+# Must be the Redis the API workers use: ingestion invalidates their cached
+# search pages, stats and suggest index by bumping an index generation there
+export REDIS_HOST="${REDIS_HOST:-localhost}"
 export OTX_API_KEY="dummy"
 source /home/coding/backend/venv/bin/activate
 python3 /home/coding/backend/app/cron/zeroday.py
+# Incremental sync; turns into a full rebuild once a day (ASRG_FULL_SYNC_INTERVAL)
+# so rescored or edited CVEs are refreshed
 python3 /home/coding/backend/app/cron/asrg_cron_job.py
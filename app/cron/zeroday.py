@@ -1,6 +1,7 @@
 from playwright.sync_api import sync_playwright
 from elasticsearch import Elasticsearch
 import json
+from app.services.zeroday_enrichment import build_zeroday_map, enrich_cve_index
 
 # Connect to Elasticsearch (adjust host/port if needed)
 es = Elasticsearch("http://localhost:9200")  # or your actual ES host
@@ -51,5 +52,8 @@ def scrape_vicone_zerodays():
 
         print(f"\nScraped and indexed {len(all_data)} entries into Elasticsearch index 'zeroday'.")
 
+        # Denormalize the fresh entries onto the matching CVE documents
+        enrich_cve_index(build_zeroday_map(all_data))
+
 if __name__ == "__main__":
     scrape_vicone_zerodays()
@@ -1,12 +1,38 @@
-
-from fastapi import FastAPI
-from app.api.routes import ioc, asrg, cve_router
-
-
-app = FastAPI(title="Cyber Threat Intelligence Dashboard")
-
-app.include_router(ioc.router, prefix="/api/ioc", tags=["IOC"])
-
-app.include_router(asrg.router, prefix="/api/asrg", tags=["ASRG CVEs"])
- 
-app.include_router(cve_router.router, prefix="/api/search", tags=["search"])
\ No newline at end of file
+
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from app.api.routes import ioc, asrg, cve_router
+from app.core.elasticsearch_client import async_es
+from app.core.http_client import close_http_client
+from app.core.index_templates import ensure_index_templates
+from app.core.redis_client import redis_client
+from app.services.vt_scheduler import vt_scheduler
+from app.services.ioc_refresh_sweeper import ioc_refresh_sweeper
+from app.services.suggest_service import suggest_service
+from app.services.embedded_search import embedded_index
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_index_templates(async_es)
+    await embedded_index.aload()
+    ioc_refresh_sweeper.start()
+    warmup = asyncio.create_task(suggest_service.warm())
+    yield
+    warmup.cancel()
+    await ioc_refresh_sweeper.stop()
+    await vt_scheduler.close()
+    # Release pooled upstream and Elasticsearch connections
+    await close_http_client()
+    await async_es.close()
+    await redis_client.aclose()
+
+
+app = FastAPI(title="Cyber Threat Intelligence Dashboard", lifespan=lifespan)
+
+app.include_router(ioc.router, prefix="/api/ioc", tags=["IOC"])
+
+app.include_router(asrg.router, prefix="/api/asrg", tags=["ASRG CVEs"])
+ 
+app.include_router(cve_router.router, prefix="/api/search", tags=["search"])
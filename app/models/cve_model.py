@@ -1,24 +1,58 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 from datetime import datetime
 
+# Response models document the API; search results may be projected with
+# fields/compact, so every CVE field is optional
+
 class CVSS(BaseModel):
-    baseScore: float
-    baseSeverity: str
+    baseScore: Optional[float] = None
+    baseSeverity: Optional[str] = None
+
+class ZeroDayEntry(BaseModel):
+    zero_day_id: Optional[str] = None
+    category: Optional[str] = None
+    impact: Optional[str] = None
 
 class CVEItem(BaseModel):
-    id: str
-    name: str
-    description: str
-    cvss: CVSS
-    createdBy: str
-    created: datetime
-    modified: datetime
-    relevance: bool
-    sectors: List[str]
-    search_term: str
-    timestamp: datetime
+    model_config = ConfigDict(extra="allow")
+
+    id: Optional[str] = None
+    name: Optional[str] = None
+    description: Optional[str] = None
+    cvss: Optional[CVSS] = None
+    createdBy: Optional[str] = None
+    created: Optional[datetime] = None
+    modified: Optional[datetime] = None
+    relevance: Optional[bool] = None
+    sectors: Optional[List[str]] = None
+    zero_day: Optional[List[ZeroDayEntry]] = None
+
+class Pagination(BaseModel):
+    page_size: int
+    total_results: int
+    has_next: bool
+    # Page-number pagination
+    current_page: Optional[int] = None
+    total_pages: Optional[int] = None
+    has_previous: Optional[bool] = None
+    next_page: Optional[int] = None
+    previous_page: Optional[int] = None
+    # Cursor pagination
+    next_cursor: Optional[str] = None
 
 class CVESearchResponse(BaseModel):
-    total: int
+    count: int
+    results: List[CVEItem]
+    pagination: Pagination
+    query: str
+    search_type: str
+
+class CVELookupRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+class CVELookupResponse(BaseModel):
+    count: int
     results: List[CVEItem]
+    missing: List[str]
+    invalid: List[str]
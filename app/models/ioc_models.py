@@ -1,4 +1,61 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
 
 class IOCRequest(BaseModel):
     value: str
+
+# Most IOCs one request may send for enrichment
+MAX_BATCH_IOCS = 1000
+
+class IOCBatchRequest(BaseModel):
+    values: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_IOCS)
+
+# Compact summaries stored with each cached IOC in place of the full upstream response
+
+class VTDetectionStats(BaseModel):
+    harmless: int = 0
+    malicious: int = 0
+    suspicious: int = 0
+    undetected: int = 0
+    timeout: int = 0
+
+class VTSummary(BaseModel):
+    id: Optional[str] = None
+    object_type: Optional[str] = None
+    detection_stats: Optional[VTDetectionStats] = None
+    reputation: Optional[int] = None
+    last_analysis_date: Optional[datetime] = None
+    tags: List[str] = []
+    meaningful_name: Optional[str] = None
+    type_description: Optional[str] = None
+    size: Optional[int] = None
+    country: Optional[str] = None
+    as_owner: Optional[str] = None
+    asn: Optional[int] = None
+    categories: Optional[Dict[str, str]] = None
+    # Set for search results (e.g. email lookups)
+    matches: Optional[int] = None
+    results: Optional[List["VTSummary"]] = None
+
+class OTXPulse(BaseModel):
+    id: str
+    name: str
+    created: Optional[str] = None
+    TLP: Optional[str] = None
+
+class OTXSummary(BaseModel):
+    indicator: Optional[str] = None
+    type: Optional[str] = None
+    reputation: Optional[int] = None
+    pulse_count: int = 0
+    pulses: List[OTXPulse] = []
+    tags: List[str] = []
+    country_name: Optional[str] = None
+    asn: Optional[str] = None
+
+class IOCAnalysisResponse(BaseModel):
+    ioc: str
+    # Summary (or full upstream response) per source, or {"error": ...}
+    otx: Dict[str, Any]
+    virustotal: Dict[str, Any]
@@ -1,23 +1,42 @@
 import requests
+import itertools
+from collections import deque
 import json
+import re
+import threading
 import time
-from typing import List, Dict, Any
+from queue import Queue, Full
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from fastapi import HTTPException
+from elasticsearch import helpers
+from elasticsearch.exceptions import NotFoundError
 from app.core.elasticsearch_client import es  
+from app.core.config import settings
+from app.core.index_templates import ensure_index_templates_sync, BULK_REFRESH_INTERVAL
+from app.services.cve_service import invalidate_index_cache
+from app.services.embedded_search import SnapshotWriter, rebuild_snapshot
+from app.services.ingest_state import FeedWatermark, load_state, save_state, clear_state, full_sync_due
+from app.services.zeroday_enrichment import build_zeroday_map, attach_zero_days
+from app.services.search_cache import bump_index_generation
+
+# Bulk item errors included in the ingestion result (all of them are printed)
+MAX_REPORTED_ERRORS = 20
+
 class ASRGVulnerabilityService:
     @staticmethod
-    def fetch_all_vulnerabilities(search_term: str) -> List[Dict[str, Any]]:
+    def iter_vulnerability_pages(search_term: str) -> Iterator[List[Dict[str, Any]]]:
         """
-        Fetch all vulnerabilities from the API using cursor-based pagination.
+        Yield the vulnerabilities from the API one page at a time, following
+        the cursor-based pagination.
         
         Args:
             search_term: The search term to filter vulnerabilities
             
-        Returns:
-            List of all vulnerability records
+        Yields:
+            The vulnerability records of each page
         """
         base_url = "https://api.asrg.io"
-        all_vulnerabilities = []
+        total_collected = 0
         cursor = ""
         page_count = 0
         
@@ -62,31 +81,16 @@ class ASRGVulnerabilityService:
                 vulnerabilities = data.get("vulnerabilities", [])
                 page_info = data.get("pageInfo", {})
                 
-                # Add current page vulnerabilities to our collection
-                all_vulnerabilities.extend(vulnerabilities)
+                total_collected += len(vulnerabilities)
                 page_count += 1
                 
                 print(f"Fetched {len(vulnerabilities)} vulnerabilities from page {page_count}")
-                print(f"Total vulnerabilities collected: {len(all_vulnerabilities)}")
+                print(f"Total vulnerabilities collected: {total_collected}")
                 print(f"Total count from API: {page_info.get('totalCount', 'Unknown')}")
                 
                 # Check if there are more pages
                 has_next_page = page_info.get("hasNextPage", False)
                 
-                if not has_next_page:
-                    print("No more pages to fetch. Done!")
-                    break
-                
-                # Get the cursor for the next page
-                cursor = page_info.get("endCursor", "")
-                
-                if not cursor:
-                    print("No end cursor found, stopping pagination")
-                    break
-                
-                # Add a small delay to be respectful to the API
-                time.sleep(0.5)
-                
             except requests.exceptions.RequestException as e:
                 print(f"Error making request: {e}")
                 raise HTTPException(status_code=500, detail=f"API request failed: {str(e)}")
@@ -96,119 +100,451 @@ class ASRGVulnerabilityService:
             except KeyboardInterrupt:
                 print("\nOperation cancelled by user")
                 raise HTTPException(status_code=400, detail="Operation cancelled")
-        
-        return all_vulnerabilities
+
+            # Hand the page downstream (outside the try, so consumer errors are not reported as API errors)
+            yield vulnerabilities
+
+            if not has_next_page:
+                print("No more pages to fetch. Done!")
+                break
+            
+            # Get the cursor for the next page
+            cursor = page_info.get("endCursor", "")
+            
+            if not cursor:
+                print("No end cursor found, stopping pagination")
+                break
+            
+            # Add a small delay to be respectful to the API
+            time.sleep(0.5)
+
+    @classmethod
+    def fetch_all_vulnerabilities(cls, search_term: str) -> List[Dict[str, Any]]:
+        """
+        Fetch all vulnerabilities from the API into a list.
+        Ingestion streams iter_vulnerability_pages instead.
+        """
+        return [vuln for page in cls.iter_vulnerability_pages(search_term) for vuln in page]
+
+    @staticmethod
+    def prefetch_pages(pages: Iterator[List[Dict[str, Any]]]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Fetch the next page in a background thread while the caller processes
+        the current one. At most one page waits in the hand-off queue.
+        """
+        queue: Queue = Queue(maxsize=1)
+        stop = threading.Event()
+        done = object()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.5)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for page in pages:
+                    if not put(page):
+                        return
+                put(done)
+            except BaseException as e:
+                put(e)
+
+        threading.Thread(target=produce, name="asrg-prefetch", daemon=True).start()
+        try:
+            while True:
+                item = queue.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # The consumer stopped (or failed): let the producer exit
+            stop.set()
 
     @staticmethod
-    def index_vulnerabilities(search_term: str, vulnerabilities: List[Dict[str, Any]]) -> Dict:
+    def _versions(alias: str) -> List[str]:
+        """Versioned indices behind ``alias``, oldest first"""
+        pattern = re.compile(rf"^{re.escape(alias)}-v\d{{14}}$")
+        indices = es.indices.get(index=f"{alias}-v*", expand_wildcards="open")
+        return sorted(name for name in indices if pattern.match(name))
+
+    @staticmethod
+    def _live_version(alias: str) -> Optional[str]:
+        """Index the read alias points to (None before the first aliased run)"""
+        try:
+            return next(iter(es.indices.get_alias(name=alias)), None)
+        except NotFoundError:
+            return None
+
+    @classmethod
+    def _swap_alias(cls, alias: str, target: str) -> None:
+        """Atomically point ``alias`` at ``target``"""
+        actions = [{"add": {"index": target, "alias": alias}}]
+        live = cls._live_version(alias)
+        if live is not None:
+            actions.insert(0, {"remove": {"index": live, "alias": alias}})
+        elif es.indices.exists(index=alias):
+            # Concrete index from before ingestion was versioned: replace it in the same call
+            actions.insert(0, {"remove_index": {"index": alias}})
+        es.indices.update_aliases(actions=actions)
+        invalidate_index_cache(alias)
+        bump_index_generation(alias)
+
+    @classmethod
+    def _prune_versions(cls, alias: str, live: str) -> None:
+        """Keep the live version and the settings.asrg_keep_versions before it"""
+        older = [name for name in cls._versions(alias) if name < live]
+        stale = older[:-settings.asrg_keep_versions] if settings.asrg_keep_versions else older
+        for name in stale:
+            es.indices.delete(index=name)
+            print(f"Deleted old index version: {name}")
+
+    @staticmethod
+    def _validation_problem(alias: str, index_name: str, acknowledged: int) -> Optional[str]:
+        """Why the freshly loaded ``index_name`` must not replace the live index, or None"""
+        indexed = es.count(index=index_name)["count"]
+        if indexed != acknowledged:
+            return f"{index_name} holds {indexed} documents, {acknowledged} were acknowledged"
+        if not indexed:
+            return f"No documents were indexed into {index_name}"
+        if settings.asrg_min_doc_ratio and es.indices.exists(index=alias):
+            live_count = es.count(index=alias)["count"]
+            if indexed < live_count * settings.asrg_min_doc_ratio:
+                return f"{index_name} holds {indexed} documents against {live_count} in the live index"
+        return None
+
+    @classmethod
+    def index_vulnerabilities(cls, search_term: str, vulnerabilities: Iterable[Dict[str, Any]]) -> Dict:
         """
-        Index vulnerabilities in Elasticsearch with the search term as index name.
-        Deletes existing index if it exists.
+        Index vulnerabilities into a new versioned index, then point the
+        ``asrg-{search_term}`` alias at it. The previous version keeps serving
+        searches until the swap, and is kept for rollback.
+
+        ``vulnerabilities`` may be a generator: documents are indexed as they arrive.
         
         Args:
             search_term: The search term used (will be index name)
-            vulnerabilities: List of vulnerabilities to index
+            vulnerabilities: Vulnerabilities to index
             
         Returns:
             Dictionary with operation results
         """
-        if not vulnerabilities:
+        vulnerabilities = iter(vulnerabilities)
+        first = next(vulnerabilities, None)
+        if first is None:
             return {"status": "error", "message": "No vulnerabilities to index"}
         
-        index_name = f"asrg-{search_term.lower()}"
+        alias = f"asrg-{search_term.lower()}"
+        index_name = f"{alias}-v{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+        snapshot = None
+        created = False
         
         try:
-            # Delete existing index if it exists
-            if es.indices.exists(index=index_name):
-                es.indices.delete(index=index_name)
-                print(f"Deleted existing index: {index_name}")
+            # The new version picks up the managed asrg-* template; refresh
+            # stays off while loading
+            ensure_index_templates_sync(es)
+            es.indices.create(index=index_name, settings={"index": {"refresh_interval": "-1"}})
+            created = True
+            print(f"Created index version: {index_name}")
             
-            # Create new index and add documents
-            success_count = 0
-            for vuln in vulnerabilities:
-                try:
+            # Add documents; the same documents feed the snapshot behind the
+            # embedded (fallback) search index, which is named after the alias
+            snapshot = SnapshotWriter(alias)
+            # Zero-day entries are joined in while indexing, so documents carry them from the start
+            zeroday_map = build_zeroday_map()
+            # Documents sent but not yet acknowledged, in bulk order
+            pending = deque()
+            timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            # CVE IDs already sent: a repeated CVE would overwrite its earlier copy
+            # (from a concurrent bulk worker, in no particular order), so only the
+            # first one, the newest in the feed, is indexed
+            sent_ids = set()
+            duplicates = []
+
+            def actions() -> Iterator[Dict[str, Any]]:
+                for vuln in itertools.chain([first], vulnerabilities):
+                    name = vuln.get("name")
+                    if name:
+                        if name in sent_ids:
+                            duplicates.append(name)
+                            continue
+                        sent_ids.add(name)
                     # Add some metadata
-                    doc = {
-                        **vuln,
-                        "search_term": search_term,
-                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-                    }
-                    es.index(index=index_name, document=doc)
+                    doc = attach_zero_days({**vuln, "search_term": search_term, "timestamp": timestamp}, zeroday_map)
+                    pending.append(doc)
+                    action = {"_index": index_name, "_source": doc}
+                    # Keyed by CVE ID so lookups can use mget instead of a search
+                    if vuln.get("name"):
+                        action["_id"] = vuln["name"]
+                    yield action
+
+            success_count = 0
+            total_count = 0
+            errors = []
+            for ok, item in helpers.parallel_bulk(
+                es, actions(),
+                thread_count=settings.es_bulk_workers,
+                chunk_size=settings.es_bulk_chunk_size,
+                raise_on_error=False,
+                raise_on_exception=False
+            ):
+                # parallel_bulk reports items in the order they were sent
+                doc = pending.popleft()
+                total_count += 1
+                if ok:
+                    snapshot.add(doc)
                     success_count += 1
-                except Exception as e:
-                    print(f"Error indexing document {vuln.get('name')}: {e}")
+                else:
+                    error = item.get("index", item)
+                    print(f"Error indexing document {doc.get('name')}: {error.get('error')}")
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({"name": doc.get("name"), "status": error.get("status"), "error": error.get("error")})
             
-            # Refresh index to make documents searchable immediately
+            # Restore refresh and make documents searchable immediately
+            es.indices.put_settings(index=index_name, settings={"index": {"refresh_interval": BULK_REFRESH_INTERVAL}})
             es.indices.refresh(index=index_name)
+
+            if duplicates:
+                print(f"Skipped {len(duplicates)} repeated CVEs in the feed: {', '.join(duplicates[:MAX_REPORTED_ERRORS])}")
+
+            # Validate the new version before it goes live
+            problem = cls._validation_problem(alias, index_name, success_count)
+            if problem:
+                print(f"Not swapping {alias}: {problem}")
+                es.indices.delete(index=index_name)
+                snapshot.abort()
+                return {"status": "error", "message": problem, "errors": errors}
+
+            cls._swap_alias(alias, index_name)
+            print(f"Alias {alias} now points to {index_name}")
+            print(f"Wrote embedded search snapshot with {snapshot.close()} documents")
+            snapshot = None
+            cls._prune_versions(alias, index_name)
             
             return {
                 "status": "success",
-                "index": index_name,
+                "index": alias,
+                "version": index_name,
                 "documents_indexed": success_count,
-                "total_documents": len(vulnerabilities),
+                "total_documents": total_count,
+                "failed_documents": total_count - success_count,
+                "duplicate_documents": len(duplicates),
+                "errors": errors,
                 "message": f"Successfully indexed {success_count} vulnerabilities"
             }
             
+        except Exception as e:
+            if snapshot is not None:
+                snapshot.abort()
+            if created:
+                try:
+                    if cls._live_version(alias) != index_name:
+                        # The live version is untouched; drop the half-built one
+                        es.indices.delete(index=index_name, ignore_unavailable=True)
+                except Exception as cleanup_error:
+                    print(f"Could not remove {index_name}: {cleanup_error}")
+            if isinstance(e, HTTPException):
+                # Fetch errors raised by the upstream stage
+                raise
+            print(f"Elasticsearch error: {e}")
+            raise HTTPException(status_code=500, detail=f"Elasticsearch error: {str(e)}")
+
+    @staticmethod
+    def _rebuild_snapshot(alias: str) -> None:
+        """Rewrite the embedded search snapshot from what ``alias`` now serves"""
+        documents = rebuild_snapshot(alias)
+        print(f"Wrote embedded search snapshot with {documents} documents")
+
+    @classmethod
+    def rollback(cls, search_term: str, version: Optional[str] = None) -> Dict:
+        """
+        Point the ``asrg-{search_term}`` alias back at a kept version
+        (by default the one before the live version) and rebuild the
+        embedded search snapshot from it.
+        """
+        alias = f"asrg-{search_term.lower()}"
+        try:
+            versions = cls._versions(alias)
+            live = cls._live_version(alias)
+            if version is None:
+                older = [name for name in versions if live is None or name < live]
+                if not older:
+                    return {"status": "error", "index": alias, "message": "No previous version to roll back to"}
+                version = older[-1]
+            elif version not in versions:
+                return {"status": "error", "index": alias, "message": f"Unknown version: {version}"}
+
+            cls._swap_alias(alias, version)
+            print(f"Rolled back {alias} from {live} to {version}")
+            # The saved watermark describes the version rolled away from
+            clear_state(alias)
+            cls._rebuild_snapshot(alias)
+            return {"status": "success", "index": alias, "version": version, "previous_version": live}
         except Exception as e:
             print(f"Elasticsearch error: {e}")
             raise HTTPException(status_code=500, detail=f"Elasticsearch error: {str(e)}")
 
+    @staticmethod
+    def _is_relevant(vuln: Dict[str, Any]) -> bool:
+        return bool(vuln.get("relevance", False) or vuln.get("_source", {}).get("relevance", False))
+
     @classmethod
     def fetch_and_index(cls, search_term: str) -> Dict:
         """
         Main method to fetch, filter, and index vulnerabilities.
+
+        Runs as a streaming pipeline: page fetch (one page ahead, in the
+        background) → raw dump → relevance filter → filtered dump + severity
+        counts → indexing, so only a page or two is in memory at any time.
         """
         print(f"\nStarting vulnerability collection for: {search_term}")
 
+        raw_file = f"/tmp/{search_term}_raw.jsonl"
+        filtered_file = f"/tmp/{search_term}_filtered.jsonl"
+        totals = {"fetched": 0, "relevant": 0}
+        severity_counts: Dict[str, int] = {}
+        latest_cves: List[str] = []
+        # Where the next incremental sync can stop
+        watermark = FeedWatermark()
+
         try:
-            # Step 1: Fetch vulnerabilities
-            vulnerabilities = cls.fetch_all_vulnerabilities(search_term)
+            with open(raw_file, "w", encoding="utf-8") as raw_out, \
+                    open(filtered_file, "w", encoding="utf-8") as filtered_out:
+
+                def relevant_vulnerabilities() -> Iterator[Dict[str, Any]]:
+                    for page in cls.prefetch_pages(cls.iter_vulnerability_pages(search_term)):
+                        for vuln in page:
+                            # Save raw vulnerabilities (optional)
+                            totals["fetched"] += 1
+                            raw_out.write(json.dumps(vuln) + "\n")
+                            watermark.observe(vuln)
+
+                            # Filter relevance:true
+                            if not cls._is_relevant(vuln):
+                                continue
+                            totals["relevant"] += 1
+                            filtered_out.write(json.dumps(vuln) + "\n")
 
-            if not vulnerabilities:
+                            # Severity counts, computed on the fly
+                            severity = vuln.get("cvss", {}).get("baseSeverity", "unknown")
+                            severity_counts[severity] = severity_counts.get(severity, 0) + 1
+                            if len(latest_cves) < 3:
+                                latest_cves.append(vuln["name"])
+                            yield vuln
+
+                # Index relevant vulnerabilities into Elasticsearch as they stream in
+                index_result = cls.index_vulnerabilities(search_term, relevant_vulnerabilities())
+
+            print(f"Saved raw data to {raw_file}")
+            print(f"Filtered {totals['relevant']}/{totals['fetched']} vulnerabilities as relevant")
+            print(f"Saved filtered data to {filtered_file}")
+
+            if not totals["fetched"]:
                 return {
                     "status": "success",
                     "message": "No vulnerabilities found",
                     "index": f"asrg-{search_term.lower()}",
                     "documents_indexed": 0
                 }
+            if index_result["status"] != "success":
+                return {**index_result, "index": f"asrg-{search_term.lower()}"}
+            save_state(index_result["index"], {
+                **watermark.to_state(),
+                "mode": "full",
+                "last_full_sync": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            })
 
-            # Step 2: Save raw vulnerabilities to a file (optional)
-            raw_file = f"/tmp/{search_term}_raw.jsonl"
-            with open(raw_file, "w", encoding="utf-8") as f:
-                for vuln in vulnerabilities:
-                    f.write(json.dumps(vuln) + "\n")
-            print(f"Saved raw data to {raw_file}")
+            return {
+                "status": "success",
+                "index": index_result["index"],
+                "documents_indexed": totals["relevant"],
+                "total_in_api": totals["fetched"],
+                "severity_counts": severity_counts,
+                "latest_cves": latest_cves
+            }
 
-            # Step 3: Filter relevance:true
-            filtered_vulnerabilities = [
-                vuln for vuln in vulnerabilities
-                if vuln.get("relevance", False) or vuln.get("_source", {}).get("relevance", False)
-            ]
-            print(f"Filtered {len(filtered_vulnerabilities)}/{len(vulnerabilities)} vulnerabilities as relevant")
-
-            # Step 4: Save filtered file (optional)
-            filtered_file = f"/tmp/{search_term}_filtered.jsonl"
-            with open(filtered_file, "w", encoding="utf-8") as f:
-                for vuln in filtered_vulnerabilities:
-                    f.write(json.dumps(vuln) + "\n")
-            print(f"Saved filtered data to {filtered_file}")
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            return {
+                "status": "error",
+                "message": str(e),
+                "index": f"asrg-{search_term.lower()}"
+            }
+
+    @classmethod
+    def sync_incremental(cls, search_term: str) -> Dict:
+        """
+        Fetch only the vulnerabilities created since the last run and upsert
+        the relevant ones into the live index.
 
-            # Step 5: Index filtered vulnerabilities into Elasticsearch
-            index_result = cls.index_vulnerabilities(search_term, filtered_vulnerabilities)
+        The feed is sorted newest first, so pagination stops at the first record
+        older than the persisted watermark. Edits to already ingested CVEs do not
+        move them in that order, so once the last full rebuild is older than
+        settings.asrg_full_sync_interval this runs a full fetch_and_index instead,
+        as it does without a watermark or a live index.
+        """
+        alias = f"asrg-{search_term.lower()}"
+        print(f"\nStarting incremental vulnerability sync for: {search_term}")
+
+        try:
+            state = load_state(alias)
+            if state is None or cls._live_version(alias) is None:
+                print("No previous sync state or live index, running a full sync")
+                return cls.fetch_and_index(search_term)
+            if full_sync_due(state, settings.asrg_full_sync_interval):
+                print("Last full sync is too old to trust for edited records, running a full sync")
+                return cls.fetch_and_index(search_term)
 
-            # Step 6: Prepare severity counts
-            severity_counts = {}
-            for vuln in filtered_vulnerabilities:
-                severity = vuln.get("cvss", {}).get("baseSeverity", "unknown")
-                severity_counts[severity] = severity_counts.get(severity, 0) + 1
+            previous = FeedWatermark.from_state(state)
+            watermark = FeedWatermark.from_state(state)
+            delta: List[Dict[str, Any]] = []
+            fetched = 0
+            pages = 0
+            caught_up = False
+            for page in cls.iter_vulnerability_pages(search_term):
+                pages += 1
+                for vuln in page:
+                    position = previous.position(vuln)
+                    if position == "older":
+                        caught_up = True
+                        break
+                    if position == "seen":
+                        continue
+                    fetched += 1
+                    watermark.observe(vuln)
+                    if cls._is_relevant(vuln):
+                        delta.append(vuln)
+                if caught_up:
+                    # Closing the generator stops pagination here
+                    break
+            print(f"Fetched {fetched} new vulnerabilities in {pages} pages, {len(delta)} relevant")
+
+            upsert_result = cls._upsert_vulnerabilities(alias, search_term, delta) if delta else {"upserted": 0, "errors": []}
+            if upsert_result["errors"]:
+                # Keep the old watermark so the next run retries this delta
+                print("Not advancing the sync watermark after indexing errors")
+            else:
+                save_state(alias, {
+                    **watermark.to_state(),
+                    "mode": "incremental",
+                    "last_full_sync": state.get("last_full_sync")
+                })
 
             return {
                 "status": "success",
-                "index": index_result["index"],
-                "documents_indexed": len(filtered_vulnerabilities),
-                "total_in_api": len(vulnerabilities),
-                "severity_counts": severity_counts,
-                "latest_cves": [v["name"] for v in filtered_vulnerabilities[:3]]
+                "mode": "incremental",
+                "index": alias,
+                "pages_fetched": pages,
+                "new_in_api": fetched,
+                "documents_upserted": upsert_result["upserted"],
+                "errors": upsert_result["errors"],
+                "latest_cves": [v["name"] for v in delta[:3]]
             }
 
         except Exception as e:
@@ -216,5 +552,37 @@ class ASRGVulnerabilityService:
             return {
                 "status": "error",
                 "message": str(e),
-                "index": f"asrg-{search_term.lower()}"
-            }
\ No newline at end of file
+                "index": alias
+            }
+
+    @classmethod
+    def _upsert_vulnerabilities(cls, alias: str, search_term: str, vulnerabilities: List[Dict[str, Any]]) -> Dict:
+        """Index (create or replace by CVE ID) a delta into the live index behind ``alias``"""
+        zeroday_map = build_zeroday_map()
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        actions = (
+            {
+                "_index": alias,
+                "_id": vuln["name"],
+                "_source": attach_zero_days({**vuln, "search_term": search_term, "timestamp": timestamp}, zeroday_map)
+            }
+            for vuln in vulnerabilities
+        )
+        upserted, failures = helpers.bulk(
+            es, actions,
+            chunk_size=settings.es_bulk_chunk_size,
+            raise_on_error=False,
+            raise_on_exception=False
+        )
+        errors = []
+        for failure in failures:
+            error = failure.get("index", failure)
+            print(f"Error indexing document {error.get('_id')}: {error.get('error')}")
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"name": error.get("_id"), "status": error.get("status"), "error": error.get("error")})
+
+        es.indices.refresh(index=alias)
+        invalidate_index_cache(alias)
+        bump_index_generation(alias)
+        cls._rebuild_snapshot(alias)
+        return {"upserted": upserted, "errors": errors}
@@ -1,11 +1,73 @@
-from typing import List, Dict, Optional, Tuple
-from app.core.elasticsearch_client import es
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from app.core.elasticsearch_client import async_es
 from elasticsearch.exceptions import NotFoundError, ConnectionError
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.embedded_search import embedded_index
+from app.services.search_cache import search_result_cache, normalize_search_query, index_generation
+import base64
+import json
 import logging
 import re
+import time
 
 logger = logging.getLogger(__name__)
 
+# ES index.max_result_window: from + size may not go past this
+MAX_RESULT_WINDOW = 10000
+PIT_KEEP_ALIVE = "2m"
+
+# Fields added by ingestion, not part of the CVE record
+INGESTION_FIELDS = ["search_term", "timestamp"]
+
+# compact=true: what a list view needs
+COMPACT_FIELDS = ["id", "name", "cvss.baseScore", "cvss.baseSeverity", "created"]
+
+# Indices found missing, with the time until which searches skip ES for them.
+# Replaces a per-request indices.exists probe; ingestion clears it.
+INDEX_MISSING_RETRY = 30.0
+_missing_indices: Dict[str, float] = {}
+
+
+def invalidate_index_cache(index_name: Optional[str] = None) -> None:
+    """Forget cached index availability (called when ingestion finishes)"""
+    if index_name is None:
+        _missing_indices.clear()
+    else:
+        _missing_indices.pop(index_name, None)
+
+
+def _index_known_missing(index_name: str) -> bool:
+    retry_at = _missing_indices.get(index_name)
+    return retry_at is not None and time.monotonic() < retry_at
+
+
+def _mark_index_missing(index_name: str) -> None:
+    _missing_indices[index_name] = time.monotonic() + INDEX_MISSING_RETRY
+
+
+def _project_source(doc: Dict, fields: Optional[List[str]]) -> Dict:
+    """Apply the same _source filtering as CVEService._source_filter to a local document"""
+    if not fields:
+        return {key: value for key, value in doc.items() if key not in INGESTION_FIELDS}
+    projected: Dict = {}
+    for field in fields:
+        value = doc
+        parts = field.split(".")
+        for part in parts:
+            value = value.get(part) if isinstance(value, dict) else None
+        if value is None:
+            continue
+        target = projected
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return projected
+
+
+# Dashboard statistics change only with ingestion, but are cheap to recompute
+_stats_cache = TTLCache(maxsize=256, ttl=settings.search_stats_ttl)
+
 class CVEService:
     def __init__(self, index_name: str = "asrg-cve"):
         self.index_name = index_name
@@ -16,93 +78,384 @@ class CVEService:
         cve_pattern = r'^CVE-\d{4}-\d{4,}$'
         return bool(re.match(cve_pattern, query.upper()))
 
-    def search(self, query: str, page: int = 1, page_size: int = 10) -> Dict:
+    def _build_query(self, query: str) -> Tuple[Dict, str]:
+        """Return the ES query and search type for a user query"""
+        if not query or not query.strip():
+            # Return all documents if no query provided
+            return {"match_all": {}}, "keyword"
+        if self._is_cve_format(query.strip()):
+            # Exact match for CVE identifiers
+            return {"term": {"name": query.strip().upper()}}, "cve_exact"
+        # Multi-field search for keywords
+        return {
+            "multi_match": {
+                "query": query,
+                "fields": ["name.text^2", "description"],  # Boost name field
+                "type": "best_fields",
+                "operator": "and"
+            }
+        }, "keyword"
+
+    def _cursor_sort(self, query: str) -> List[Dict]:
+        """Stable sort for cursor pagination; _shard_doc breaks ties within the PIT"""
+        sort = [
+            {"created": {"order": "desc", "unmapped_type": "date"}},
+            {"_shard_doc": "asc"}
+        ]
+        if query and query.strip():
+            sort.insert(0, {"_score": "desc"})
+        return sort
+
+    @staticmethod
+    def _encode_cursor(state: Dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Dict:
+        try:
+            return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def _source_filter(fields: Optional[List[str]]) -> Dict:
+        """_source filtering pushed down to ES: the requested fields, or everything but ingestion metadata"""
+        if fields:
+            return {"includes": list(fields)}
+        return {"excludes": INGESTION_FIELDS}
+
+    async def search(self, query: str, page: int = 1, page_size: int = 10, cursor: Optional[str] = None,
+                     fields: Optional[List[str]] = None) -> Dict:
         """
-        Universal search method that handles both CVE names and keywords with pagination
+        Universal search method that handles both CVE names and keywords with pagination.
+
+        Pass ``cursor="*"`` to start cursor pagination, then the returned
+        ``next_cursor`` to get each following page (cost stays flat at any depth).
+        ``fields`` limits each result to those (dotted) source fields.
         """
         try:
-            # Check if Elasticsearch client is available
-            if es is None:
-                logger.error("Elasticsearch client is not initialized")
-                return self._empty_result()
-            
-            # Check if the index exists first
-            if not es.indices.exists(index=self.index_name):
-                logger.error(f"Index '{self.index_name}' does not exist")
-                return self._empty_result()
-            
             # Validate pagination parameters
             if page < 1:
                 page = 1
             if page_size < 1 or page_size > 100:  # Limit max page size
                 page_size = 10
-            
-            # Calculate offset
-            offset = (page - 1) * page_size
-
-            if not query or not query.strip():
-                # Return all documents if no query provided
-                search_query = {"match_all": {}}
-            elif self._is_cve_format(query):
-                # Exact match for CVE identifiers
-                search_query = {
-                    "term": {
-                        "name.keyword": query.upper()
-                    }
-                }
-            else:
-                # Multi-field search for keywords
-                search_query = {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["name^2", "description"],  # Boost name field
-                        "type": "best_fields",
-                        "operator": "and"
-                    }
-                }
 
-            # Execute search with pagination
-            response = es.search(
-                index=self.index_name,
-                query=search_query,
-                from_=offset,
-                size=page_size,
-                source=True
+            # Skip ES while the index is known to be missing
+            if _index_known_missing(self.index_name):
+                return self._fallback(query, page, page_size, cursor, fields)
+
+            # Repeat queries are served from memory until ingestion bumps the index generation
+            cache_key = await search_result_cache.key(
+                self.index_name, normalize_search_query(query),
+                page if cursor is None else None, cursor, page_size,
+                tuple(sorted(fields)) if fields else None
             )
-            
-            total_hits = response["hits"]["total"]["value"]
-            results = [hit["_source"] for hit in response["hits"]["hits"]]
-            
-            # Calculate pagination metadata
-            total_pages = (total_hits + page_size - 1) // page_size  # Ceiling division
-            has_next = page < total_pages
-            has_previous = page > 1
-            
-            return {
-                "results": results,
-                "pagination": {
-                    "current_page": page,
-                    "page_size": page_size,
-                    "total_results": total_hits,
-                    "total_pages": total_pages,
-                    "has_next": has_next,
-                    "has_previous": has_previous,
-                    "next_page": page + 1 if has_next else None,
-                    "previous_page": page - 1 if has_previous else None
-                },
-                "query": query.strip() if query else "",
-                "search_type": "cve_exact" if query and self._is_cve_format(query.strip()) else "keyword"
-            }
-            
+            result = search_result_cache.get(cache_key)
+            if result is None:
+                if cursor is not None:
+                    result = await self._search_after(query, page_size, cursor, fields)
+                else:
+                    result = await self._search_pages(query, page, page_size, fields)
+                search_result_cache.set(cache_key, result, cursor=cursor)
+            return {**result, "query": query.strip() if query else ""}
+
+        except ValueError:
+            raise
         except NotFoundError as e:
-            logger.error(f"Index not found: {e}")
-            return self._empty_result()
+            logger.error(f"Index '{self.index_name}' does not exist: {e}")
+            _mark_index_missing(self.index_name)
+            return self._fallback(query, page, page_size, cursor, fields)
         except ConnectionError as e:
             logger.error(f"Elasticsearch connection error: {e}")
-            return self._empty_result()
+            return self._fallback(query, page, page_size, cursor, fields)
         except Exception as e:
             logger.error(f"Unexpected error during CVE search: {e}")
+            return self._fallback(query, page, page_size, cursor, fields)
+
+    def _embedded_ready(self) -> bool:
+        return embedded_index.index_name == self.index_name and embedded_index.loaded
+
+    def _fallback(self, query: str, page: int, page_size: int, cursor: Optional[str],
+                  fields: Optional[List[str]]) -> Dict:
+        """Answer from the embedded snapshot index when ES cannot be used"""
+        if cursor is not None or not self._embedded_ready():
+            return self._empty_result()
+        try:
+            result = embedded_index.search(query, page=page, page_size=page_size)
+        except Exception as e:
+            logger.error(f"Embedded CVE search failed: {e}")
             return self._empty_result()
+        result["results"] = [_project_source(doc, fields) for doc in result["results"]]
+        return result
+
+    async def _search_pages(self, query: str, page: int, page_size: int, fields: Optional[List[str]] = None) -> Dict:
+        """One page of page-number (from/size) pagination"""
+        # Calculate offset
+        offset = (page - 1) * page_size
+        if offset + page_size > MAX_RESULT_WINDOW:
+            raise ValueError(
+                f"Page-number pagination is limited to the first {MAX_RESULT_WINDOW} results, use cursor pagination"
+            )
+
+        search_query, search_type = self._build_query(query)
+
+        # Listing without a query follows the index sort (newest first)
+        sort = None if query and query.strip() else [{"created": {"order": "desc", "unmapped_type": "date"}}]
+
+        # Execute search with pagination
+        response = await async_es.search(
+            index=self.index_name,
+            query=search_query,
+            sort=sort,
+            from_=offset,
+            size=page_size,
+            source=self._source_filter(fields)
+        )
+        
+        total_hits = response["hits"]["total"]["value"]
+        results = [hit["_source"] for hit in response["hits"]["hits"]]
+        
+        # Calculate pagination metadata
+        total_pages = (total_hits + page_size - 1) // page_size  # Ceiling division
+        has_next = page < total_pages
+        has_previous = page > 1
+        
+        return {
+            "results": results,
+            "pagination": {
+                "current_page": page,
+                "page_size": page_size,
+                "total_results": total_hits,
+                "total_pages": total_pages,
+                "has_next": has_next,
+                "has_previous": has_previous,
+                "next_page": page + 1 if has_next else None,
+                "previous_page": page - 1 if has_previous else None
+            },
+            "query": query.strip() if query else "",
+            "search_type": search_type
+        }
+
+    async def _search_after(self, query: str, page_size: int, cursor: str, fields: Optional[List[str]] = None) -> Dict:
+        """One page of cursor pagination over a point-in-time snapshot of the index"""
+        query = query.strip() if query else ""
+        if cursor == "*":
+            pit_id = (await async_es.open_point_in_time(index=self.index_name, keep_alive=PIT_KEEP_ALIVE))["id"]
+            search_after = None
+        else:
+            state = self._decode_cursor(cursor)
+            # Compared in the same normalized form the result cache is keyed by
+            if state.get("q") != normalize_search_query(query):
+                raise ValueError("Cursor does not belong to this query")
+            pit_id, search_after = state["pit"], state["after"]
+
+        search_query, search_type = self._build_query(query)
+        params = {}
+        if search_after is not None:
+            params["search_after"] = search_after
+        try:
+            response = await async_es.search(
+                query=search_query,
+                pit={"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+                sort=self._cursor_sort(query),
+                # One hit past the page tells whether there is a next one
+                size=page_size + 1,
+                source=self._source_filter(fields),
+                **params
+            )
+        except NotFoundError:
+            raise ValueError("Cursor expired, start again with cursor=*")
+
+        hits = response["hits"]["hits"]
+        pit_id = response.get("pit_id", pit_id)
+        has_next = len(hits) > page_size
+        hits = hits[:page_size]
+        if has_next:
+            next_cursor = self._encode_cursor({
+                "pit": pit_id, "after": hits[-1]["sort"], "q": normalize_search_query(query)
+            })
+        else:
+            # Not closed: cached cursor pages share this PIT between clients, so it
+            # is left to expire with its keep-alive
+            next_cursor = None
+
+        return {
+            "results": [hit["_source"] for hit in hits],
+            "pagination": {
+                "page_size": page_size,
+                "total_results": response["hits"]["total"]["value"],
+                "has_next": has_next,
+                "next_cursor": next_cursor
+            },
+            "query": query,
+            "search_type": search_type
+        }
+
+    async def open_pit(self) -> str:
+        """Open a point in time over the index; raises NotFoundError if the index is missing"""
+        return (await async_es.open_point_in_time(index=self.index_name, keep_alive=PIT_KEEP_ALIVE))["id"]
+
+    async def iter_documents(self, query: str = "", fields: Optional[List[str]] = None,
+                             batch_size: int = 1000, pit_id: Optional[str] = None) -> AsyncIterator[Dict]:
+        """
+        Yield every document matching ``query`` from a point-in-time snapshot,
+        one search_after batch at a time, so memory stays flat for any corpus size.
+        ``pit_id`` is a point in time from open_pit(); it is closed once iteration ends.
+        """
+        search_query, _ = self._build_query(query)
+        if pit_id is None:
+            pit_id = await self.open_pit()
+        search_after = None
+        try:
+            while True:
+                params = {"search_after": search_after} if search_after is not None else {}
+                response = await async_es.search(
+                    query=search_query,
+                    pit={"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+                    sort=[{"_shard_doc": "asc"}],
+                    size=batch_size,
+                    source=self._source_filter(fields),
+                    track_total_hits=False,
+                    **params
+                )
+                pit_id = response.get("pit_id", pit_id)
+                hits = response["hits"]["hits"]
+                for hit in hits:
+                    yield hit["_source"]
+                if len(hits) < batch_size:
+                    break
+                search_after = hits[-1]["sort"]
+        finally:
+            try:
+                await async_es.close_point_in_time(id=pit_id)
+            except Exception:
+                pass  # expires on its own
+
+    async def stats(self, query: Optional[str] = None, severity: Optional[str] = None,
+                    sector: Optional[str] = None, top: int = 10) -> Dict:
+        """
+        Severity counts, CVSS histogram, monthly trends and top sectors/authors
+        computed by Elasticsearch in a single aggregation request
+        """
+        cache_key = (
+            self.index_name, await index_generation(self.index_name),
+            normalize_search_query(query), severity, sector, top
+        )
+        cached = _stats_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        search_query, _ = self._build_query(query or "")
+        filters = []
+        if severity:
+            filters.append({"term": {"cvss.baseSeverity": severity.upper()}})
+        if sector:
+            filters.append({"term": {"sectors": sector}})
+
+        response = await async_es.search(
+            index=self.index_name,
+            size=0,
+            track_total_hits=True,
+            query={"bool": {"must": [search_query], "filter": filters}},
+            aggs={
+                "severity": {"terms": {"field": "cvss.baseSeverity", "size": 10}},
+                "cvss": {
+                    "histogram": {
+                        "field": "cvss.baseScore",
+                        "interval": 1,
+                        "min_doc_count": 0,
+                        "extended_bounds": {"min": 0, "max": 10}
+                    }
+                },
+                "created": {"date_histogram": {"field": "created", "calendar_interval": "month", "format": "yyyy-MM"}},
+                "modified": {"date_histogram": {"field": "modified", "calendar_interval": "month", "format": "yyyy-MM"}},
+                "sectors": {"terms": {"field": "sectors", "size": top}},
+                "created_by": {"terms": {"field": "createdBy", "size": top}}
+            }
+        )
+
+        aggs = response["aggregations"]
+        result = {
+            "total": response["hits"]["total"]["value"],
+            "severity_counts": {b["key"]: b["doc_count"] for b in aggs["severity"]["buckets"]},
+            "cvss_histogram": [{"score": b["key"], "count": b["doc_count"]} for b in aggs["cvss"]["buckets"]],
+            "created_per_month": [{"month": b["key_as_string"], "count": b["doc_count"]} for b in aggs["created"]["buckets"]],
+            "modified_per_month": [{"month": b["key_as_string"], "count": b["doc_count"]} for b in aggs["modified"]["buckets"]],
+            "top_sectors": [{"sector": b["key"], "count": b["doc_count"]} for b in aggs["sectors"]["buckets"]],
+            "top_created_by": [{"name": b["key"], "count": b["doc_count"]} for b in aggs["created_by"]["buckets"]],
+            "query": query.strip() if query else ""
+        }
+        _stats_cache.set(cache_key, result)
+        return result
+
+    async def lookup(self, cve_ids: List[str], fields: Optional[List[str]] = None) -> Dict:
+        """
+        Resolve a list of CVE IDs in one round trip.
+
+        Documents are keyed by CVE ID, so this is a single mget; IDs it does not
+        find are retried with one terms query (documents indexed before IDs were
+        used as keys). Falls back to the embedded snapshot when ES is unavailable.
+        """
+        normalized = [cve_id.strip().upper() for cve_id in cve_ids]
+        invalid = [cve_id for cve_id in normalized if not self._is_cve_format(cve_id)]
+        # Duplicates dropped in linear time, first occurrence order kept
+        requested = list(dict.fromkeys(cve_id for cve_id in normalized if self._is_cve_format(cve_id)))
+
+        found: Dict[str, Dict] = {}
+        if requested:
+            try:
+                if _index_known_missing(self.index_name):
+                    found = self._lookup_embedded(requested, fields)
+                else:
+                    found = await self._lookup_es(requested, fields)
+            except NotFoundError as e:
+                logger.error(f"Index '{self.index_name}' does not exist: {e}")
+                _mark_index_missing(self.index_name)
+                found = self._lookup_embedded(requested, fields)
+            except Exception as e:
+                logger.error(f"Error during CVE lookup: {e}")
+                found = self._lookup_embedded(requested, fields)
+
+        return {
+            "found": [found[cve_id] for cve_id in requested if cve_id in found],
+            "missing": [cve_id for cve_id in requested if cve_id not in found],
+            "invalid": invalid
+        }
+
+    async def _lookup_es(self, cve_ids: List[str], fields: Optional[List[str]]) -> Dict[str, Dict]:
+        source = self._source_filter(fields)
+        params = {"source_includes": source["includes"]} if "includes" in source else {"source_excludes": source["excludes"]}
+        response = await async_es.mget(index=self.index_name, ids=cve_ids, **params)
+        found = {doc["_id"]: doc["_source"] for doc in response["docs"] if doc.get("found")}
+
+        remaining = [cve_id for cve_id in cve_ids if cve_id not in found]
+        if remaining:
+            # "name" is always fetched so hits can be matched back to the requested IDs
+            if fields and "name" not in fields:
+                source = {"includes": [*fields, "name"]}
+            response = await async_es.search(
+                index=self.index_name,
+                query={"terms": {"name": remaining}},
+                size=len(remaining),
+                source=source
+            )
+            for hit in response["hits"]["hits"]:
+                doc = hit["_source"]
+                name = (doc.get("name") or "").upper()
+                if fields and "name" not in fields:
+                    doc = {key: value for key, value in doc.items() if key != "name"}
+                found.setdefault(name, doc)
+        return found
+
+    def _lookup_embedded(self, cve_ids: List[str], fields: Optional[List[str]]) -> Dict[str, Dict]:
+        if not self._embedded_ready():
+            return {}
+        found = {}
+        for cve_id in cve_ids:
+            doc = embedded_index.get(cve_id)
+            if doc is not None:
+                found[cve_id] = _project_source(doc, fields)
+        return found
 
     def _empty_result(self) -> Dict:
         """Return empty result structure"""
@@ -122,20 +475,26 @@ class CVEService:
             "search_type": "keyword"
         }
 
-    def get_all_cves(self, page: int = 1, page_size: int = 10) -> Dict:
+    async def get_all_cves(self, page: int = 1, page_size: int = 10, cursor: Optional[str] = None,
+                           fields: Optional[List[str]] = None) -> Dict:
         """
         Get all CVEs with pagination - useful for browsing all CVEs
         """
-        return self.search("", page=page, page_size=page_size)
+        return await self.search("", page=page, page_size=page_size, cursor=cursor, fields=fields)
 
-    def search_cve(self, name: Optional[str] = None, keyword: Optional[str] = None) -> List[Dict]:
+    async def search_cve(self, name: Optional[str] = None, keyword: Optional[str] = None,
+                         fields: Optional[List[str]] = None) -> List[Dict]:
         """Legacy method - use search() instead"""
         if name:
-            result = self.search(name, page=1, page_size=100)
+            result = await self.search(name, page=1, page_size=100, fields=fields)
             return result["results"]
         elif keyword:
-            result = self.search(keyword, page=1, page_size=100)
+            result = await self.search(keyword, page=1, page_size=100, fields=fields)
             return result["results"]
         else:
-            result = self.search("", page=1, page_size=100)
+            result = await self.search("", page=1, page_size=100, fields=fields)
             return result["results"]
+
+
+# Shared instance used by the search routes
+cve_service = CVEService()
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional
+from elasticsearch import helpers
+from app.core.config import settings
+from app.core.elasticsearch_client import es
+
+logger = logging.getLogger(__name__)
+
+_token_re = re.compile(r"[a-z0-9]+")
+_cve_re = re.compile(r"^CVE-\d{4}-\d{4,}$")
+
+# Snapshot versions kept next to the current one
+KEEP_SNAPSHOTS = 1
+
+# How often a loaded index checks for a newer snapshot
+RELOAD_CHECK_INTERVAL = 10.0
+
+
+def _tokens(text: str) -> List[str]:
+    return _token_re.findall(text.lower())
+
+
+def snapshot_dir(index_name: str) -> str:
+    return os.path.join(settings.cve_snapshot_dir, index_name)
+
+
+class SnapshotWriter:
+    """
+    Streams documents into an on-disk snapshot that EmbeddedSearchIndex memory-maps.
+
+    Layout of one snapshot version:
+      docs.jsonl    one JSON document per line
+      offsets.bin   uint64 start offset of each document in docs.jsonl
+      postings.bin  uint32 doc ids, one sorted run per term
+      terms.json    {"terms": {term: [start, count]}, "names": {cve_id: doc_id}}
+    ``CURRENT`` in the snapshot directory names the live version and is
+    replaced atomically when a new snapshot is complete.
+    """
+
+    def __init__(self, index_name: str):
+        self.root = snapshot_dir(index_name)
+        self.version = time.strftime("%Y%m%dT%H%M%S", time.gmtime()) + f"-{time.time_ns() % 10**9:09d}-{os.getpid()}"
+        self.path = os.path.join(self.root, self.version)
+        os.makedirs(self.path, exist_ok=True)
+        self._docs = open(os.path.join(self.path, "docs.jsonl"), "wb")
+        self._offsets = array("Q")
+        self._postings: Dict[str, array] = {}
+        self._names: Dict[str, int] = {}
+
+    def add(self, doc: dict) -> None:
+        doc_id = len(self._offsets)
+        self._offsets.append(self._docs.tell())
+        self._docs.write(json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n")
+
+        name = doc.get("name") or ""
+        if name:
+            self._names[name.upper()] = doc_id
+        for token in set(_tokens(f"{name} {doc.get('description') or ''}")):
+            self._postings.setdefault(token, array("I")).append(doc_id)
+
+    def close(self) -> int:
+        """Finish the snapshot, make it current and drop old versions; returns the doc count."""
+        self._docs.close()
+        with open(os.path.join(self.path, "offsets.bin"), "wb") as f:
+            self._offsets.tofile(f)
+
+        terms = {}
+        position = 0
+        with open(os.path.join(self.path, "postings.bin"), "wb") as f:
+            for term, doc_ids in self._postings.items():
+                doc_ids.tofile(f)
+                terms[term] = [position, len(doc_ids)]
+                position += len(doc_ids)
+        with open(os.path.join(self.path, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump({"terms": terms, "names": self._names}, f)
+
+        current_tmp = os.path.join(self.root, f"CURRENT.{os.getpid()}")
+        with open(current_tmp, "w") as f:
+            f.write(self.version)
+        os.replace(current_tmp, os.path.join(self.root, "CURRENT"))
+        self._prune()
+        return len(self._offsets)
+
+    def abort(self) -> None:
+        self._docs.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _prune(self) -> None:
+        versions = sorted(
+            entry for entry in os.listdir(self.root)
+            if entry != self.version and os.path.isdir(os.path.join(self.root, entry))
+        )
+        for old in versions[:-KEEP_SNAPSHOTS] if KEEP_SNAPSHOTS else versions:
+            shutil.rmtree(os.path.join(self.root, old), ignore_errors=True)
+
+
+def write_snapshot(index_name: str, docs: Iterable[dict]) -> int:
+    writer = SnapshotWriter(index_name)
+    try:
+        for doc in docs:
+            writer.add(doc)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def rebuild_snapshot(index_name: str) -> int:
+    """Rewrite the snapshot of ``index_name`` (an alias or index) from what Elasticsearch now serves"""
+    # Newest first, the order ingestion writes snapshots in
+    hits = helpers.scan(
+        es, index=index_name,
+        query={"sort": [{"created": {"order": "desc", "unmapped_type": "date"}}]},
+        preserve_order=True
+    )
+    return write_snapshot(index_name, (hit["_source"] for hit in hits))
+
+
+class _LoadedSnapshot:
+    """One snapshot version: memory-mapped documents and postings plus its term dictionary"""
+
+    def __init__(self, version: str, files: list, maps: list, meta: dict):
+        self.version = version
+        # The files stay open as long as their maps are in use
+        self.files = files
+        self.docs = maps[0]
+        self.offsets = memoryview(maps[1]).cast("Q")
+        self.postings = memoryview(maps[2]).cast("I")
+        self.terms: Dict[str, List[int]] = meta["terms"]
+        self.names: Dict[str, int] = meta["names"]
+
+    def doc(self, doc_id: int) -> dict:
+        start = self.offsets[doc_id]
+        end = self.docs.find(b"\n", start)
+        return json.loads(self.docs[start:end])
+
+    def posting(self, term: str) -> Optional[memoryview]:
+        entry = self.terms.get(term)
+        if entry is None:
+            return None
+        start, count = entry
+        return self.postings[start:start + count]
+
+
+class EmbeddedSearchIndex:
+    """
+    In-process inverted index over CVE ``name`` and ``description``, loaded
+    memory-mapped from the latest ingestion snapshot. Used by CVEService for
+    searches and lookups while Elasticsearch is unavailable; a snapshot can lag
+    behind the index, so a healthy cluster is always asked first.
+
+    A loaded snapshot is replaced as a whole, so a query sees either the old
+    or the new version; newer snapshots are read in a worker thread.
+    """
+
+    def __init__(self, index_name: str = "asrg-cve"):
+        self.index_name = index_name
+        self._snapshot: Optional[_LoadedSnapshot] = None
+        self._checked_at = 0.0
+        self._reload_task: Optional[asyncio.Task] = None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._snapshot.version if self._snapshot is not None else None
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def _read_current(self) -> Optional[_LoadedSnapshot]:
+        """Read the current snapshot if it is not the loaded one (blocking file I/O)."""
+        root = snapshot_dir(self.index_name)
+        try:
+            with open(os.path.join(root, "CURRENT")) as f:
+                version = f.read().strip()
+        except OSError:
+            return None
+        if version == self.version:
+            return None
+
+        path = os.path.join(root, version)
+        try:
+            with open(os.path.join(path, "terms.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            files = [open(os.path.join(path, name), "rb") for name in ("docs.jsonl", "offsets.bin", "postings.bin")]
+            maps = [mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+                    for f in files]
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load CVE snapshot {path}: {e}")
+            return None
+        return _LoadedSnapshot(version, files, maps, meta)
+
+    def _install(self, snapshot: Optional[_LoadedSnapshot]) -> None:
+        # The old maps are released once no query uses them any more
+        if snapshot is not None and snapshot.version != self.version:
+            self._snapshot = snapshot
+            logger.info(f"Loaded embedded CVE index {snapshot.version} ({len(snapshot.offsets)} documents)")
+
+    def load(self) -> bool:
+        """(Re)load the current snapshot if it changed; returns whether an index is available."""
+        self._install(self._read_current())
+        return self.loaded
+
+    async def aload(self) -> bool:
+        """load() without blocking the event loop: the snapshot is read in a worker thread."""
+        self._install(await asyncio.to_thread(self._read_current))
+        return self.loaded
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.load()
+            return
+        # On the event loop the current snapshot keeps answering until the new one is read
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = loop.create_task(self.aload())
+
+    def get(self, cve_id: str) -> Optional[dict]:
+        """Exact lookup by CVE identifier."""
+        self._maybe_reload()
+        snapshot = self._snapshot
+        doc_id = snapshot.names.get(cve_id.upper())
+        return snapshot.doc(doc_id) if doc_id is not None else None
+
+    def match(self, query: str) -> List[int]:
+        """Doc ids containing every token of ``query`` (all documents for an empty query)."""
+        self._maybe_reload()
+        return self._match(self._snapshot, query)
+
+    @staticmethod
+    def _match(snapshot: _LoadedSnapshot, query: str) -> List[int]:
+        tokens = set(_tokens(query))
+        if not tokens:
+            return list(range(len(snapshot.offsets)))
+        postings = []
+        for token in tokens:
+            posting = snapshot.posting(token)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        result = postings[0].tolist()
+        for posting in postings[1:]:
+            allowed = set(posting.tolist())
+            result = [doc_id for doc_id in result if doc_id in allowed]
+            if not result:
+                break
+        return result
+
+    def search(self, query: str, page: int = 1, page_size: int = 10) -> Dict:
+        """Same result shape as CVEService page-number search."""
+        query = query.strip() if query else ""
+        if query and _cve_re.match(query.upper()):
+            doc = self.get(query)
+            results = [doc] if doc else []
+            total = len(results)
+            search_type = "cve_exact"
+        else:
+            self._maybe_reload()
+            snapshot = self._snapshot
+            doc_ids = self._match(snapshot, query)
+            total = len(doc_ids)
+            offset = (page - 1) * page_size
+            # Snapshots hold documents newest first (feed order, or sorted on created when rebuilt)
+            results = [snapshot.doc(doc_id) for doc_id in doc_ids[offset:offset + page_size]]
+            search_type = "keyword"
+
+        total_pages = (total + page_size - 1) // page_size
+        has_next = page < total_pages
+        has_previous = page > 1
+        return {
+            "results": results,
+            "pagination": {
+                "current_page": page,
+                "page_size": page_size,
+                "total_results": total,
+                "total_pages": total_pages,
+                "has_next": has_next,
+                "has_previous": has_previous,
+                "next_page": page + 1 if has_next else None,
+                "previous_page": page - 1 if has_previous else None
+            },
+            "query": query,
+            "search_type": search_type
+        }
+
+
+embedded_index = EmbeddedSearchIndex()
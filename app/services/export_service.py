@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+import logging
+import zlib
+from typing import AsyncIterator, List, Optional
+from app.services.cve_service import cve_service
+
+# Columns of the CSV export when no fields are requested
+CSV_FIELDS = [
+    "id", "name", "description", "cvss.baseScore", "cvss.baseSeverity",
+    "createdBy", "created", "modified", "sectors"
+]
+
+# Documents serialized before a compressed block is flushed to the client
+FLUSH_EVERY = 500
+
+# Last record of an export that failed part way, once the response has started
+INTERRUPTED_MESSAGE = "Export interrupted, the file is incomplete"
+
+logger = logging.getLogger(__name__)
+
+
+def _get_path(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    if isinstance(value, list):
+        return ";".join(str(item) for item in value)
+    return value
+
+
+async def export_cves(query: str = "", export_format: str = "ndjson",
+                      fields: Optional[List[str]] = None, pit_id: Optional[str] = None) -> AsyncIterator[bytes]:
+    """
+    Stream every CVE matching ``query`` as gzip-compressed NDJSON or CSV.
+
+    Documents come from a point-in-time scan (``pit_id``, opened up front by
+    the caller so a missing index is reported before the response starts) and
+    are compressed block by block, so memory use does not depend on the size
+    of the corpus. If reading fails part way, the file ends with an error
+    record and a complete gzip trailer.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    buffer = io.StringIO()
+    writer = None
+    if export_format == "csv":
+        columns = fields or CSV_FIELDS
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+
+    pending = 0
+    try:
+        async for doc in cve_service.iter_documents(query, fields=fields, pit_id=pit_id):
+            if writer is not None:
+                writer.writerow([_get_path(doc, column) for column in columns])
+            else:
+                buffer.write(json.dumps(doc, ensure_ascii=False))
+                buffer.write("\n")
+            pending += 1
+            if pending >= FLUSH_EVERY:
+                chunk = compressor.compress(buffer.getvalue().encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+                if chunk:
+                    yield chunk
+    except Exception as e:
+        # The status line is already sent: say so in the file instead of cutting the stream
+        logger.error(f"CVE export failed part way: {e}")
+        if writer is not None:
+            writer.writerow([f"# {INTERRUPTED_MESSAGE}"])
+        else:
+            buffer.write(json.dumps({"error": INTERRUPTED_MESSAGE}))
+            buffer.write("\n")
+
+    yield compressor.compress(buffer.getvalue().encode("utf-8")) + compressor.flush()
@@ -0,0 +1,99 @@
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+from elasticsearch.exceptions import NotFoundError
+from app.core.elasticsearch_client import es
+
+# One document per ingested feed (keyed by its alias), holding the sync watermark
+INGEST_STATE_INDEX = "ingest-state"
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class FeedWatermark:
+    """
+    High-water mark of a feed sorted newest ``created`` first: the newest
+    ``created`` seen and the IDs of the records at exactly that time (so
+    records sharing the boundary timestamp are neither lost nor ingested twice).
+    """
+
+    def __init__(self, created: Optional[str] = None, boundary_ids: Iterable[str] = ()):
+        self.created = created
+        self.boundary_ids = set(boundary_ids)
+
+    @classmethod
+    def from_state(cls, state: Optional[Dict]) -> "FeedWatermark":
+        state = state or {}
+        return cls(state.get("watermark_created"), state.get("boundary_ids") or ())
+
+    def position(self, vuln: Dict) -> str:
+        """'new', 'seen' (boundary record ingested last time) or 'older' than the watermark"""
+        watermark = _parse_time(self.created)
+        created = _parse_time(vuln.get("created"))
+        if watermark is None or created is None or created > watermark:
+            return "new"
+        if created == watermark:
+            return "seen" if vuln.get("name") in self.boundary_ids else "new"
+        return "older"
+
+    def observe(self, vuln: Dict) -> None:
+        created = _parse_time(vuln.get("created"))
+        if created is not None:
+            watermark = _parse_time(self.created)
+            if watermark is None or created > watermark:
+                self.created = vuln["created"]
+                self.boundary_ids = {vuln.get("name")}
+            elif created == watermark:
+                self.boundary_ids.add(vuln.get("name"))
+
+    def to_state(self) -> Dict:
+        return {
+            "watermark_created": self.created,
+            "boundary_ids": sorted(name for name in self.boundary_ids if name)
+        }
+
+
+def full_sync_due(state: Optional[Dict], interval: int) -> bool:
+    """Whether the last full rebuild recorded in ``state`` is older than ``interval`` seconds"""
+    if not interval:
+        return False
+    last_full = _parse_time((state or {}).get("last_full_sync"))
+    if last_full is None:
+        return True
+    if last_full.tzinfo is None:
+        last_full = last_full.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - last_full).total_seconds() >= interval
+
+
+def load_state(key: str) -> Optional[Dict]:
+    try:
+        return es.get(index=INGEST_STATE_INDEX, id=key)["_source"]
+    except NotFoundError:
+        return None
+
+
+def save_state(key: str, state: Dict) -> None:
+    es.index(
+        index=INGEST_STATE_INDEX,
+        id=key,
+        document={**state, "updated_at": _now()}
+    )
+
+
+def clear_state(key: str) -> None:
+    """Forget the watermark, so the next incremental sync runs in full"""
+    try:
+        es.delete(index=INGEST_STATE_INDEX, id=key)
+    except NotFoundError:
+        pass
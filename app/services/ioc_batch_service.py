@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+from app.core.config import settings
+from app.core.elasticsearch_client import async_es
+from app.services.ioc_cache import ioc_cache
+from app.services.ioc_freshness import is_stale, record_hit, schedule_refresh
+from app.services.ioc_projection import compact_entry, render_entry
+from app.services.ioc_sources import SOURCES
+from app.services.ioc_utils import dedupe_iocs
+
+logger = logging.getLogger(__name__)
+
+
+def _serve_cached(source: str, ioc: str, doc: dict) -> dict:
+    """Count the hit and, if the entry has expired, refresh it in the background."""
+    record_hit(source, ioc)
+    if is_stale(doc):
+        fetch = SOURCES[source].fetch
+        schedule_refresh(source, ioc, lambda: fetch(ioc))
+    return doc
+
+
+async def _lookup_cached(iocs: List[str]) -> Dict[str, Dict[str, dict]]:
+    """Resolve cache hits for every IOC and source: L1/L2 first, then a single mget."""
+    cached: Dict[str, Dict[str, dict]] = {ioc: {} for ioc in iocs}
+    docs = []
+    keys = []
+    for source, ioc_source in SOURCES.items():
+        hits = await ioc_cache.get_many(source, iocs)
+        for ioc in iocs:
+            if ioc in hits:
+                cached[ioc][source] = _serve_cached(source, ioc, hits[ioc])
+            else:
+                docs.append({"_index": ioc_source.index, "_id": ioc_source.doc_id(ioc)})
+                keys.append((ioc, source))
+
+    if not keys:
+        return cached
+    try:
+        res = await async_es.mget(docs=docs, source_excludes=["raw_gz"])
+    except Exception as e:
+        logger.warning(f"IOC cache mget failed, fetching misses upstream: {e}")
+        return cached
+
+    for (ioc, source), hit in zip(keys, res["docs"]):
+        if hit.get("found"):
+            entry = compact_entry(hit["_source"])
+            await ioc_cache.set(source, ioc, entry)
+            cached[ioc][source] = _serve_cached(source, ioc, entry)
+    return cached
+
+
+async def _render(ioc: str, entries: Dict[str, dict], full: bool, fields: Optional[List[str]]) -> dict:
+    result = {"ioc": ioc}
+    for source, entry in entries.items():
+        ioc_source = SOURCES[source]
+        result[source] = await render_entry(entry, ioc_source.index, ioc_source.doc_id(ioc), full=full, fields=fields)
+    return result
+
+
+def _source_budgets() -> Dict[str, int]:
+    """Upstream fetches one batch may start per source, for the sources with a daily quota."""
+    return {"virustotal": int(settings.vt_requests_per_day * settings.ioc_batch_vt_quota_share)}
+
+
+async def _resolve_source(ioc: str, source: str, semaphore: asyncio.Semaphore, budgets: Dict[str, int],
+                          full: bool, fields: Optional[List[str]]) -> dict:
+    """Fetch one source missing from the cache for one IOC."""
+    if source in budgets:
+        if budgets[source] <= 0:
+            entry = {"ioc": ioc, "source": source,
+                     "summary": {"error": f"Batch quota share for {source} used up, look the IOC up on its own"}}
+            return await _render(ioc, {source: entry}, full, fields)
+        budgets[source] -= 1
+    async with semaphore:
+        entry = await SOURCES[source].fetch(ioc)
+    return await _render(ioc, {source: entry}, full, fields)
+
+
+async def analyze_batch(values: List[str], full: bool = False,
+                        fields: Optional[List[str]] = None) -> AsyncIterator[dict]:
+    """
+    Analyze many IOCs at once, yielding results as soon as they are ready.
+
+    Cache hits are answered first from the cache tiers and a single mget, one result per IOC
+    with every cached source. Each miss goes upstream on its own and is yielded as a result
+    holding that source alone, so fast OTX answers do not wait on the VirusTotal quota. Each
+    source fetches at most ``settings.ioc_batch_concurrency`` IOCs at a time, and one batch
+    spends at most ``settings.ioc_batch_vt_quota_share`` of the daily VirusTotal quota.
+    """
+    iocs = dedupe_iocs(values)
+    if not iocs:
+        return
+
+    cached = await _lookup_cached(iocs)
+    semaphores = {source: asyncio.Semaphore(settings.ioc_batch_concurrency) for source in SOURCES}
+    budgets = _source_budgets()
+    pending = []
+
+    for ioc in iocs:
+        found = cached[ioc]
+        if found:
+            yield await _render(ioc, found, full, fields)
+        for source in SOURCES:
+            if source not in found:
+                pending.append(asyncio.create_task(
+                    _resolve_source(ioc, source, semaphores[source], budgets, full, fields)
+                ))
+
+    try:
+        for next_done in asyncio.as_completed(pending):
+            yield await next_done
+    finally:
+        # Stop upstream work if the client went away mid-stream
+        for task in pending:
+            task.cancel()
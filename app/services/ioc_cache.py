@@ -0,0 +1,119 @@
+import json
+import logging
+from typing import Dict, List, Optional
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.redis_client import redis_client, redis_available, mark_redis_failure
+
+logger = logging.getLogger(__name__)
+
+
+class IOCResultCache:
+    """
+    Two-tier cache for IOC documents, sitting in front of the ES-backed caches.
+
+    L1 is an in-process LRU with a short TTL; L2 is Redis, shared by every
+    uvicorn worker. Values are the cache documents stored in ``otx-iocs`` /
+    ``vt-iocs`` without the compressed raw body (``ioc``, ``type``, ``source``,
+    ``fetched_at``, ``summary``).
+    "Not found" answers from upstream are stored as negative entries
+    (``"negative": True``) with their own, shorter TTL.
+    """
+
+    def __init__(self):
+        self.l1 = TTLCache(maxsize=settings.ioc_cache_l1_size, ttl=settings.ioc_cache_l1_ttl)
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.negative_hits = 0
+
+    @staticmethod
+    def _key(source: str, ioc: str) -> str:
+        return f"ioc-cache:{source}:{ioc}"
+
+    def _count(self, entry: dict) -> dict:
+        if entry.get("negative"):
+            self.negative_hits += 1
+        return entry
+
+    async def get(self, source: str, ioc: str) -> Optional[dict]:
+        """Return the cached document for (source, ioc), or None on a miss."""
+        key = self._key(source, ioc)
+        entry = self.l1.get(key)
+        if entry is not None:
+            return self._count(entry)
+
+        if not redis_available():
+            return None
+        try:
+            payload = await redis_client.get(key)
+        except Exception as e:
+            mark_redis_failure(e)
+            return None
+        if payload is None:
+            self.l2_misses += 1
+            return None
+
+        self.l2_hits += 1
+        entry = json.loads(payload)
+        self.l1.set(key, entry)
+        return self._count(entry)
+
+    async def get_many(self, source: str, iocs: List[str]) -> Dict[str, dict]:
+        """Return the cached documents for many IOCs; L2 misses are read with one MGET."""
+        found: Dict[str, dict] = {}
+        remaining = []
+        for ioc in iocs:
+            entry = self.l1.get(self._key(source, ioc))
+            if entry is not None:
+                found[ioc] = self._count(entry)
+            else:
+                remaining.append(ioc)
+
+        if not remaining or not redis_available():
+            return found
+        try:
+            payloads = await redis_client.mget([self._key(source, ioc) for ioc in remaining])
+        except Exception as e:
+            mark_redis_failure(e)
+            return found
+
+        for ioc, payload in zip(remaining, payloads):
+            if payload is None:
+                self.l2_misses += 1
+                continue
+            self.l2_hits += 1
+            entry = json.loads(payload)
+            self.l1.set(self._key(source, ioc), entry)
+            found[ioc] = self._count(entry)
+        return found
+
+    async def set(self, source: str, ioc: str, entry: dict, ttl: Optional[int] = None) -> None:
+        """Store a document in both tiers."""
+        key = self._key(source, ioc)
+        self.l1.set(key, entry, ttl=min(ttl, self.l1.ttl) if ttl else None)
+
+        if not redis_available():
+            return
+        try:
+            await redis_client.set(key, json.dumps(entry), ex=ttl or settings.ioc_cache_l2_ttl)
+        except Exception as e:
+            mark_redis_failure(e)
+
+    async def set_negative(self, source: str, ioc: str, result: dict) -> None:
+        """Remember that upstream has nothing for this IOC."""
+        entry = {"ioc": ioc, "source": source, "negative": True, "summary": result}
+        await self.set(source, ioc, entry, ttl=settings.ioc_cache_negative_ttl)
+
+    def stats(self) -> dict:
+        return {
+            "l1": self.l1.stats(),
+            "l2": {
+                "hits": self.l2_hits,
+                "misses": self.l2_misses,
+                "available": redis_available()
+            },
+            "negative_hits": self.negative_hits
+        }
+
+
+ioc_cache = IOCResultCache()
@@ -0,0 +1,181 @@
+import codecs
+import ipaddress
+import re
+from typing import AsyncIterable, Iterable, Iterator, AsyncIterator, NamedTuple, Optional, Set
+from urllib.parse import urlsplit, urlunsplit
+
+# Defanging conventions seen in threat reports: hxxp://, evil[.]com, user[@]mail, 1.2.3[.]4 ...
+# hxxp/fxp are only refanged as a URL scheme, so names like sfxpro.com are left alone, and
+# bracketed separators only between host/label characters, so prose like "meet [at] noon"
+# or "see (.)" is left alone too.
+_defang_re = re.compile(
+    r"\b(?:hxxps?|fxp)(?=\[?\s*:\s*\]?//|\[\s*://\s*\])"
+    r"|(?<=[a-z0-9_-])(?:\[\s*(?:\.|dot|@|at)\s*\]|\(\s*(?:\.|dot|@|at)\s*\)|\{\s*(?:\.|dot)\s*\})(?=[a-z0-9])"
+    r"|(?<=[a-z0-9])(?:\[\s*:\s*\](?=//|\d)|\[\s*://\s*\](?=[a-z0-9]))",
+    re.IGNORECASE
+)
+
+# What the inside of a bracketed separator stands for
+_REFANGED = {".": ".", "dot": ".", "@": "@", "at": "@", ":": ":", "://": "://"}
+
+def _refang_match(match: "re.Match") -> str:
+    token = match.group(0).lower()
+    if token.startswith("hxxp"):
+        return "http" + token[4:]
+    if token == "fxp":
+        return "ftp"
+    return _REFANGED[token[1:-1].strip()]
+
+def refang(text: str) -> str:
+    """Turn defanged indicators back into their usable form."""
+    return _defang_re.sub(_refang_match, text)
+
+# One alternation, tried left to right at each position, classifies every token
+# in a single pass. Order matters: URLs before emails/domains, hashes by length.
+_LABEL = r"[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?"
+_DOMAIN = rf"(?:{_LABEL}\.)+[a-z][a-z0-9-]{{1,62}}"
+_IPV4 = r"(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)"
+_IOC_PATTERN = re.compile(
+    rf"""
+    (?P<url>\b(?:https?|ftp)://[^\s"'<>()\[\]{{}}]+)
+    |(?P<email>\b[a-z0-9._%+-]+@{_DOMAIN}\b)
+    |(?P<cve>\bcve-\d{{4}}-\d{{4,}}\b)
+    |(?P<ipv6>(?<![\w:.])(?:
+        (?:[0-9a-f]{{0,4}}:){{2,6}}{_IPV4}(?!\w|\.\d)            # IPv4 tail: ::ffff:1.2.3.4
+        |(?:[0-9a-f]{{0,4}}:){{2,7}}[0-9a-f]{{0,4}}(?![\w:]|\.\d)
+    ))
+    |(?P<ipv4>\b{_IPV4}\b)
+    |(?P<sha256>\b[a-f0-9]{{64}}\b)
+    |(?P<sha1>\b[a-f0-9]{{40}}\b)
+    |(?P<md5>\b[a-f0-9]{{32}}\b)
+    |(?P<domain>\b{_DOMAIN}\b)
+    """,
+    re.IGNORECASE | re.VERBOSE
+)
+
+# Tokens that look like domains but are almost always file names in reports
+_FILE_EXTENSIONS = {
+    "exe", "dll", "sys", "bat", "ps1", "vbs", "js", "py", "sh", "bin", "dat", "tmp",
+    "txt", "log", "csv", "json", "xml", "yml", "yaml", "ini", "cfg", "conf",
+    "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx", "rtf", "html", "htm", "php",
+    "png", "jpg", "jpeg", "gif", "bmp", "svg", "gz", "tar", "rar", "7z", "jar", "apk", "so"
+}
+
+HASH_TYPES = ("md5", "sha1", "sha256")
+
+# Longest token kept across a chunk boundary before it is scanned anyway
+MAX_TOKEN = 4096
+
+
+class IOC(NamedTuple):
+    type: str
+    value: str
+
+
+def _normalize(ioc_type: str, value: str) -> Optional[str]:
+    """Canonical form of a matched indicator, or None if it fails validation."""
+    if ioc_type == "url":
+        value = value.rstrip(".,;:!?")
+        try:
+            parts = urlsplit(value)
+        except ValueError:
+            return None
+        if not parts.hostname:
+            return None
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, parts.fragment))
+    if ioc_type == "ipv6":
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return None
+        if address.version != 6:
+            return None
+        if address.ipv4_mapped is not None:
+            # Dotted tail, as written in reports (and printed by newer Pythons)
+            return f"::ffff:{address.ipv4_mapped}"
+        return address.compressed
+    if ioc_type == "cve":
+        return value.upper()
+    if ioc_type == "domain":
+        value = value.lower().rstrip(".")
+        if value.rsplit(".", 1)[-1] in _FILE_EXTENSIONS:
+            return None
+        return value
+    return value.lower()
+
+
+def _scan(text: str) -> Iterator[IOC]:
+    for match in _IOC_PATTERN.finditer(text):
+        ioc_type = match.lastgroup
+        value = _normalize(ioc_type, match.group(ioc_type))
+        if value is not None:
+            yield IOC(ioc_type, value)
+
+
+def classify(value: str) -> Optional[IOC]:
+    """Classify and normalize a single indicator (defanged input is accepted)."""
+    value = refang(value.strip().strip("'\"`,;"))
+    match = _IOC_PATTERN.fullmatch(value)
+    if match is None:
+        return None
+    ioc_type = match.lastgroup
+    normalized = _normalize(ioc_type, value)
+    return IOC(ioc_type, normalized) if normalized is not None else None
+
+
+def _split_complete(buffer: str) -> int:
+    """Index up to which ``buffer`` can be scanned without cutting a token in half."""
+    cut = max(buffer.rfind(" "), buffer.rfind("\n"), buffer.rfind("\t"), buffer.rfind(","))
+    if cut < 0 and len(buffer) > MAX_TOKEN:
+        return len(buffer)
+    return cut + 1
+
+
+class IOCExtractor:
+    """
+    Incremental IOC extractor: feed text chunks, get back each new unique IOC once.
+
+    Only the trailing partial token of a chunk is carried over, so memory stays
+    bounded by the chunk size plus the set of distinct indicators seen.
+    """
+
+    def __init__(self):
+        self._carry = ""
+        self._seen: Set[IOC] = set()
+
+    def feed(self, chunk: str) -> Iterator[IOC]:
+        buffer = self._carry + chunk
+        cut = _split_complete(buffer)
+        self._carry = buffer[cut:]
+        yield from self._emit(buffer[:cut])
+
+    def close(self) -> Iterator[IOC]:
+        buffer, self._carry = self._carry, ""
+        yield from self._emit(buffer)
+
+    def _emit(self, text: str) -> Iterator[IOC]:
+        for ioc in _scan(refang(text)):
+            if ioc not in self._seen:
+                self._seen.add(ioc)
+                yield ioc
+
+
+def extract_iocs(chunks: Iterable[str]) -> Iterator[IOC]:
+    """Extract unique IOCs from an iterable of text chunks (e.g. a file opened in text mode)."""
+    extractor = IOCExtractor()
+    for chunk in chunks:
+        yield from extractor.feed(chunk)
+    yield from extractor.close()
+
+
+async def aextract_iocs(chunks: AsyncIterable[bytes], encoding: str = "utf-8") -> AsyncIterator[IOC]:
+    """Extract unique IOCs from an async stream of raw bytes, such as an uploaded file."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    extractor = IOCExtractor()
+    async for chunk in chunks:
+        for ioc in extractor.feed(decoder.decode(chunk)):
+            yield ioc
+    for ioc in extractor.feed(decoder.decode(b"", final=True)):
+        yield ioc
+    for ioc in extractor.close():
+        yield ioc
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+
+# How long a cached verdict is considered fresh, per source and IOC type.
+# IP reputation churns quickly; file hashes barely change once analysed.
+IOC_TTLS: Dict[str, Dict[str, int]] = {
+    "otx": {
+        "file": 30 * DAY,
+        "IPv4": 1 * DAY,
+        "IPv6": 1 * DAY,
+        "url": 1 * DAY,
+        "domain": 3 * DAY,
+        "email": 7 * DAY,
+        "cve": 7 * DAY,
+    },
+    "virustotal": {
+        "files": 30 * DAY,
+        "ip_addresses": 1 * DAY,
+        "urls": 1 * DAY,
+        "domains": 3 * DAY,
+        "search": 7 * DAY,
+    },
+}
+DEFAULT_TTL = 3 * DAY
+
+# Background refreshes currently running, and strong refs to their tasks
+_refreshing: Set[Tuple[str, str]] = set()
+_tasks: Set[asyncio.Task] = set()
+
+# Lookups per (source, IOC) since the sweeper last collected them
+hit_counter: Counter = Counter()
+
+
+def ttl_for(source: str, ioc_type: str) -> int:
+    return IOC_TTLS.get(source, {}).get(ioc_type, DEFAULT_TTL)
+
+
+def entry_age(doc: dict) -> float:
+    """Seconds since the document was fetched (infinite when unknown)."""
+    try:
+        fetched_at = datetime.fromisoformat(doc["fetched_at"])
+    except (KeyError, TypeError, ValueError):
+        return float("inf")
+    return (datetime.utcnow() - fetched_at).total_seconds()
+
+
+def is_stale(doc: dict, fraction: float = 1.0) -> bool:
+    """True once a cached document is older than ``fraction`` of its TTL."""
+    if doc.get("negative"):
+        return False  # negative entries expire through the cache TTL
+    return entry_age(doc) > ttl_for(doc.get("source", ""), doc.get("type", "")) * fraction
+
+
+def record_hit(source: str, ioc: str) -> None:
+    hit_counter[(source, ioc)] += 1
+
+
+def schedule_refresh(source: str, ioc: str, refresh: Callable[[], Awaitable[dict]]) -> None:
+    """Re-fetch an expired entry in the background (stale-while-revalidate)."""
+    key = (source, ioc)
+    if key in _refreshing:
+        return
+    _refreshing.add(key)
+
+    async def run():
+        try:
+            await refresh()
+        except Exception as e:
+            logger.warning(f"Background refresh of {source} IOC {ioc} failed: {e}")
+        finally:
+            _refreshing.discard(key)
+
+    task = asyncio.create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
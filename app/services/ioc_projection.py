@@ -0,0 +1,120 @@
+import base64
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+from app.core.elasticsearch_client import async_es
+from app.models.ioc_models import OTXPulse, OTXSummary, VTSummary
+
+# VT search results kept in the summary
+MAX_VT_SEARCH_RESULTS = 10
+
+
+def compress_raw(raw: dict) -> str:
+    """Compress an upstream response for the non-indexed ``raw_gz`` field."""
+    return base64.b64encode(zlib.compress(json.dumps(raw).encode("utf-8"), 6)).decode("ascii")
+
+
+def decompress_raw(raw_gz: str) -> dict:
+    return json.loads(zlib.decompress(base64.b64decode(raw_gz)))
+
+
+# Summary fields that are not copied verbatim from the VT attributes
+_VT_DERIVED_FIELDS = {"id", "object_type", "detection_stats", "last_analysis_date", "matches", "results"}
+
+
+def _vt_object_summary(obj: Dict[str, Any]) -> VTSummary:
+    attributes = obj.get("attributes", {})
+    last_analysis = attributes.get("last_analysis_date")
+    copied = {
+        key: value for key, value in attributes.items()
+        if key in VTSummary.model_fields and key not in _VT_DERIVED_FIELDS
+    }
+    return VTSummary(
+        **copied,
+        id=obj.get("id"),
+        object_type=obj.get("type"),
+        detection_stats=attributes.get("last_analysis_stats"),
+        last_analysis_date=datetime.fromtimestamp(last_analysis, tz=timezone.utc) if last_analysis else None
+    )
+
+
+def project_vt(raw: Dict[str, Any]) -> dict:
+    """Compact summary of a VirusTotal v3 response."""
+    data = raw.get("data")
+    if isinstance(data, list):
+        summary = VTSummary(
+            matches=len(data),
+            results=[_vt_object_summary(obj) for obj in data[:MAX_VT_SEARCH_RESULTS]]
+        )
+    elif isinstance(data, dict):
+        summary = _vt_object_summary(data)
+    else:
+        summary = VTSummary()
+    return summary.model_dump(mode="json", exclude_none=True)
+
+
+def project_otx(raw: Dict[str, Any]) -> dict:
+    """Compact summary of an OTX ``general`` indicator response."""
+    pulse_info = raw.get("pulse_info") or {}
+    pulses = [p for p in pulse_info.get("pulses", []) if "id" in p]
+    summary = OTXSummary(
+        indicator=raw.get("indicator"),
+        type=raw.get("type"),
+        reputation=raw.get("reputation"),
+        pulse_count=pulse_info.get("count", len(pulses)),
+        pulses=[OTXPulse(**p) for p in pulses],
+        tags=sorted({tag for p in pulses for tag in p.get("tags", [])}),
+        country_name=raw.get("country_name"),
+        asn=raw.get("asn")
+    )
+    return summary.model_dump(mode="json", exclude_none=True)
+
+
+PROJECTIONS = {
+    "otx": project_otx,
+    "virustotal": project_vt,
+}
+
+
+def compact_entry(doc: dict) -> dict:
+    """
+    Cache entry for a stored document: everything but the compressed raw body.
+
+    Documents written before projections existed carry the full ``raw``
+    response instead of a ``summary``; they are projected on read.
+    """
+    entry = {key: value for key, value in doc.items() if key not in ("raw", "raw_gz")}
+    if "summary" not in entry:
+        entry["summary"] = PROJECTIONS[doc["source"]](doc.get("raw") or {})
+    return entry
+
+
+async def load_raw(index: str, doc_id: str) -> Optional[dict]:
+    """Read and decompress the full upstream response of a cached IOC."""
+    try:
+        res = await async_es.get(index=index, id=doc_id, source_includes=["raw_gz", "raw"])
+    except Exception:
+        return None
+    source = res["_source"]
+    if "raw_gz" in source:
+        return decompress_raw(source["raw_gz"])
+    return source.get("raw")
+
+
+async def render_entry(entry: dict, index: str, doc_id: str,
+                       full: bool = False, fields: Optional[Iterable[str]] = None) -> dict:
+    """
+    API view of a cache entry: the summary by default, only the requested summary
+    ``fields`` when given, or the full upstream response with ``full=True``.
+    """
+    summary = entry["summary"] if "summary" in entry else compact_entry(entry)["summary"]
+    if "error" in summary or entry.get("negative"):
+        return summary
+    if full:
+        raw = await load_raw(index, doc_id)
+        if raw is not None:
+            return raw
+    if fields:
+        return {key: value for key, value in summary.items() if key in fields}
+    return summary
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.core.redis_client import redis_client, redis_available, mark_redis_failure
+from app.services.ioc_freshness import hit_counter, is_stale
+from app.services.ioc_sources import SOURCES
+
+logger = logging.getLogger(__name__)
+
+HOT_KEY = "ioc-hot"
+LOCK_KEY = "ioc-sweeper:lock"
+
+
+class IOCRefreshSweeper:
+    """
+    Periodically re-enrich the most looked-up IOCs before their cache entries expire.
+
+    Each worker counts lookups locally and merges them into a Redis sorted set;
+    one worker per interval (guarded by a Redis lock) takes the top N, refreshes
+    those past ``settings.ioc_refresh_ahead`` of their TTL, and halves all
+    scores so popularity decays over time. Without Redis every worker sweeps
+    its own counts.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.ioc_sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"IOC refresh sweep failed: {e}")
+
+    async def sweep(self) -> int:
+        hot = await self._collect_hot()
+        refreshes = []
+        for source, ioc in hot:
+            ioc_source = SOURCES[source]
+            doc = await ioc_source.lookup(ioc)
+            if doc is not None and is_stale(doc, settings.ioc_refresh_ahead):
+                refreshes.append(ioc_source.fetch(ioc))
+
+        # Refreshes run concurrently; the VT scheduler keeps them within quota
+        await asyncio.gather(*refreshes, return_exceptions=True)
+        self.refreshed += len(refreshes)
+        if refreshes:
+            logger.info(f"IOC sweeper refreshed {len(refreshes)} hot indicators")
+        return len(refreshes)
+
+    async def _collect_hot(self) -> List[Tuple[str, str]]:
+        counts = dict(hit_counter)
+        hit_counter.clear()
+        top_n = settings.ioc_sweep_top_n
+
+        if redis_available():
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for (source, ioc), count in counts.items():
+                    pipe.zincrby(HOT_KEY, count, f"{source}|{ioc}")
+                await pipe.execute()
+
+                if not await redis_client.set(LOCK_KEY, "1", nx=True, ex=max(1, settings.ioc_sweep_interval - 1)):
+                    return []  # another worker sweeps this round
+                members = await redis_client.zrevrange(HOT_KEY, 0, top_n - 1)
+                await redis_client.zunionstore(HOT_KEY, {HOT_KEY: 0.5})
+                await redis_client.zremrangebyrank(HOT_KEY, 0, -10 * top_n - 1)
+                return [tuple(m.decode().split("|", 1)) for m in members]
+            except Exception as e:
+                mark_redis_failure(e)
+
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return [key for key, _ in ranked[:top_n]]
+
+
+ioc_refresh_sweeper = IOCRefreshSweeper()
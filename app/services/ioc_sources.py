@@ -0,0 +1,22 @@
+from functools import partial
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+from app.services.otx_service import OTX_INDEX, otx_doc_id, lookup_otx_cache, fetch_from_otx
+from app.services.virustotal_service import VT_INDEX, vt_doc_id, lookup_vt_cache, fetch_from_virustotal
+from app.services.vt_scheduler import PRIORITY_BULK
+
+
+class IOCSource(NamedTuple):
+    # ES cache index and the cache document _id of an IOC in it
+    index: str
+    doc_id: Callable[[str], str]
+    # Cached entry of an IOC (L1/L2, then ES), or None on a miss
+    lookup: Callable[[str], Awaitable[Optional[dict]]]
+    # Upstream fetch for background and bulk work (queued behind interactive lookups)
+    fetch: Callable[[str], Awaitable[dict]]
+
+
+# Result key -> upstream source, shared by batch analysis and the refresh sweeper
+SOURCES: Dict[str, IOCSource] = {
+    "otx": IOCSource(OTX_INDEX, otx_doc_id, lookup_otx_cache, fetch_from_otx),
+    "virustotal": IOCSource(VT_INDEX, vt_doc_id, lookup_vt_cache, partial(fetch_from_virustotal, priority=PRIORITY_BULK)),
+}
@@ -0,0 +1,28 @@
+import hashlib
+from typing import Iterable, List
+from app.services.ioc_engine import classify
+
+
+def normalize_ioc(value: str) -> str:
+    """Normalize a raw (possibly defanged) IOC string so equal indicators compare equal."""
+    ioc = classify(value)
+    if ioc is not None:
+        return ioc.value
+    return value.strip().strip("'\"`,;").lower()
+
+
+def dedupe_iocs(values: Iterable[str]) -> List[str]:
+    """Normalize IOCs and drop empties and duplicates, keeping input order."""
+    seen = set()
+    iocs = []
+    for value in values:
+        ioc = normalize_ioc(value)
+        if ioc and ioc not in seen:
+            seen.add(ioc)
+            iocs.append(ioc)
+    return iocs
+
+
+def ioc_doc_id(ioc: str, ioc_type: str) -> str:
+    """Stable Elasticsearch _id for a cached IOC: one document per (type, IOC)."""
+    return hashlib.sha256(f"{ioc_type}:{normalize_ioc(ioc)}".encode("utf-8")).hexdigest()
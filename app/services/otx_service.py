@@ -1,44 +1,67 @@
-import re
 from datetime import datetime
+from typing import Iterable, Optional
+from urllib.parse import quote
 import httpx
 from app.core.config import settings
-from app.core.elasticsearch_client import es
+from app.core.elasticsearch_client import async_es
+from app.core.http_client import get_http_client
+from app.core.singleflight import SingleFlight
+from app.services.ioc_cache import ioc_cache
+from app.services.ioc_engine import classify
+from app.services.ioc_freshness import is_stale, record_hit, schedule_refresh
+from app.services.ioc_projection import compact_entry, compress_raw, project_otx, render_entry
+from app.services.ioc_utils import normalize_ioc, ioc_doc_id
 
 OTX_BASE = "https://otx.alienvault.com/api/v1/indicators"
+OTX_INDEX = "otx-iocs"
 
-# detection helpers
-_hash_re = re.compile(r"^[A-Fa-f0-9]{32}$|^[A-Fa-f0-9]{40}$|^[A-Fa-f0-9]{64}$")
-_ipv4_re = re.compile(r"^(?:\d{1,3}\.){3}\d{1,3}$")
-_email_re = re.compile(r"^[^@]+@[^@]+\.[^@]+$")
+# Concurrent lookups of the same IOC share one upstream request
+otx_singleflight = SingleFlight("otx", distributed=settings.ioc_singleflight_distributed)
+
+# ioc_engine type -> OTX indicator section
+_OTX_TYPES = {
+    "md5": "file",
+    "sha1": "file",
+    "sha256": "file",
+    "ipv4": "IPv4",
+    "ipv6": "IPv6",
+    "email": "email",
+    "url": "url",
+    "cve": "cve",
+    "domain": "domain",
+}
 
 def _detect_type(ioc: str) -> str:
     """Return the OTX indicator type string for the given IOC."""
-    if _hash_re.match(ioc):
-        return "file"
-    if _ipv4_re.match(ioc):
-        return "IPv4"
-    if _email_re.match(ioc):
-        return "email"
-    return "domain"
-
-def get_info_from_otx(ioc: str) -> dict:
-    """Get IOC data from OTX, using Elasticsearch as a cache."""
-    # 1️⃣ Check cache first
+    match = classify(ioc)
+    return _OTX_TYPES[match.type] if match is not None else "domain"
+
+def otx_doc_id(ioc: str) -> str:
+    return ioc_doc_id(ioc, _detect_type(ioc))
+
+async def lookup_otx_cache(ioc: str) -> Optional[dict]:
+    """Return the cached OTX entry for the IOC (L1/L2, then ES), or None on a miss."""
+    entry = await ioc_cache.get("otx", ioc)
+    if entry is not None:
+        return entry
+
     try:
-        query = {"query": {"match": {"ioc": ioc}}}
-        res = es.search(index="otx-iocs", body=query)
-        if res.get("hits", {}).get("total", {}).get("value", 0) > 0:
-            return res["hits"]["hits"][0]["_source"]["raw"]
+        res = await async_es.get(index=OTX_INDEX, id=otx_doc_id(ioc), source_excludes=["raw_gz"])
+        entry = compact_entry(res["_source"])
+        await ioc_cache.set("otx", ioc, entry)
+        return entry
     except Exception:
-        pass  # If ES fails, just call API
+        pass  # Not cached (404) or ES failure: just call API
+    return None
 
-    # 2️⃣ Fetch from API
+async def _fetch_from_otx(ioc: str) -> dict:
+    """Fetch IOC data from the OTX API and store it in the Elasticsearch cache."""
     ind_type = _detect_type(ioc)
-    url = f"{OTX_BASE}/{ind_type}/{ioc}/general"
+    url = f"{OTX_BASE}/{ind_type}/{quote(ioc, safe=':/@')}/general"
     headers = {"X-OTX-API-KEY": settings.otx_api_key} if getattr(settings, "otx_api_key", None) else {}
 
     try:
-        resp = httpx.get(url, headers=headers, timeout=15)
+        resp = await get_http_client().get(url, headers=headers)
         resp.raise_for_status()
         result = resp.json()
 
@@ -54,24 +77,57 @@ def get_info_from_otx(ioc: str) -> dict:
             }
             for p in pulses if "id" in p
         }
-        result["pulse_info"]["pulses"] = list(unique_pulses.values())
+        if "pulse_info" in result:
+            result["pulse_info"]["pulses"] = list(unique_pulses.values())
 
-        # Save in ES
-        doc = {
+        # Save in ES: a compact summary plus the compressed full response
+        entry = {
             "ioc": ioc,
             "type": ind_type,
             "source": "otx",
             "fetched_at": datetime.utcnow().isoformat(),
-            "raw": result
+            "summary": project_otx(result)
         }
         try:
-            es.index(index="otx-iocs", document=doc)
+            await async_es.index(
+                index=OTX_INDEX,
+                id=ioc_doc_id(ioc, ind_type),
+                document={**entry, "raw_gz": compress_raw(result)}
+            )
         except Exception:
             pass
+        await ioc_cache.set("otx", ioc, entry)
 
-        return result
+        return entry
 
     except httpx.HTTPStatusError as e:
-        return {"error": f"OTX API error: {e.response.status_code}", "details": e.response.text}
+        error = {"error": f"OTX API error: {e.response.status_code}", "details": e.response.text}
+        if e.response.status_code == 404:
+            await ioc_cache.set_negative("otx", ioc, error)
+        return {"ioc": ioc, "source": "otx", "summary": error}
     except Exception as e:
-        return {"error": str(e)}
+        return {"ioc": ioc, "source": "otx", "summary": {"error": str(e)}}
+
+async def fetch_from_otx(ioc: str) -> dict:
+    """Fetch IOC data from OTX, sharing one upstream request between concurrent callers."""
+    return await otx_singleflight.do(ioc, lambda: _fetch_from_otx(ioc), shared_result=lambda: ioc_cache.get("otx", ioc))
+
+async def get_otx_entry(ioc: str) -> dict:
+    """Return the cache entry for a normalized IOC, fetching it from OTX on a miss."""
+    # 1️⃣ Check cache first
+    cached = await lookup_otx_cache(ioc)
+    if cached is not None:
+        record_hit("otx", ioc)
+        # Serve expired entries immediately and refresh them in the background
+        if is_stale(cached):
+            schedule_refresh("otx", ioc, lambda: fetch_from_otx(ioc))
+        return cached
+
+    # 2️⃣ Fetch from API
+    return await fetch_from_otx(ioc)
+
+async def get_info_from_otx(ioc: str, full: bool = False, fields: Optional[Iterable[str]] = None) -> dict:
+    """Get IOC data from OTX, using the IOC cache tiers and Elasticsearch."""
+    ioc = normalize_ioc(ioc)
+    entry = await get_otx_entry(ioc)
+    return await render_entry(entry, OTX_INDEX, otx_doc_id(ioc), full=full, fields=fields)
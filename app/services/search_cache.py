@@ -0,0 +1,89 @@
+import logging
+import time
+from typing import Dict, Hashable, Optional, Tuple
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.redis_client import (
+    redis_client, sync_redis_client, redis_available, mark_redis_failure
+)
+
+logger = logging.getLogger(__name__)
+
+# How long a worker trusts its last read of an index generation
+GENERATION_REFRESH = 1.0
+
+# Cursor pages hold a point-in-time id shared by every client served the page, so
+# they must not outlive its keep-alive (the PIT is never closed early for this reason)
+CURSOR_PAGE_TTL = 60
+
+_local_generations: Dict[str, int] = {}
+_generation_reads: Dict[str, Tuple[float, int]] = {}
+
+
+def _generation_key(index_name: str) -> str:
+    return f"index-generation:{index_name}"
+
+
+def bump_index_generation(index_name: str) -> None:
+    """
+    Invalidate every cached search result for an index.
+
+    Called by ingestion (sync code, possibly in another process) once the
+    index content has changed.
+    """
+    _local_generations[index_name] = _local_generations.get(index_name, 0) + 1
+    _generation_reads.pop(index_name, None)
+    if redis_available():
+        try:
+            sync_redis_client.incr(_generation_key(index_name))
+            return
+        except Exception as e:
+            mark_redis_failure(e)
+    logger.warning(
+        f"Could not share the new generation of '{index_name}' through Redis: other processes "
+        f"serve cached results for up to {settings.search_cache_ttl}s"
+    )
+
+
+async def index_generation(index_name: str) -> int:
+    """Current generation of an index, shared across workers through Redis."""
+    now = time.monotonic()
+    read = _generation_reads.get(index_name)
+    if read is not None and now - read[0] < GENERATION_REFRESH:
+        return read[1]
+
+    generation = _local_generations.get(index_name, 0)
+    if redis_available():
+        try:
+            shared = await redis_client.get(_generation_key(index_name))
+            generation += int(shared or 0)
+        except Exception as e:
+            mark_redis_failure(e)
+    _generation_reads[index_name] = (now, generation)
+    return generation
+
+
+def normalize_search_query(query: Optional[str]) -> str:
+    return " ".join((query or "").split()).lower()
+
+
+class SearchResultCache:
+    """LRU cache of search responses, keyed by index generation and request shape."""
+
+    def __init__(self):
+        self.results = TTLCache(maxsize=settings.search_cache_size, ttl=settings.search_cache_ttl)
+
+    async def key(self, index_name: str, *parts: Hashable) -> tuple:
+        return (index_name, await index_generation(index_name)) + parts
+
+    def get(self, key: tuple) -> Optional[Dict]:
+        return self.results.get(key)
+
+    def set(self, key: tuple, result: Dict, cursor: Optional[str] = None) -> None:
+        self.results.set(key, result, ttl=CURSOR_PAGE_TTL if cursor is not None else None)
+
+    def stats(self) -> Dict:
+        return self.results.stats()
+
+
+search_result_cache = SearchResultCache()
@@ -0,0 +1,139 @@
+import asyncio
+import heapq
+import logging
+import re
+import time
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from app.services.cve_service import cve_service
+from app.services.search_cache import index_generation
+
+logger = logging.getLogger(__name__)
+
+MIN_PREFIX = 2
+
+# Seconds before another build is attempted after one failed
+BUILD_RETRY_AFTER = 30.0
+
+_word_re = re.compile(r"[a-z][a-z0-9+-]{2,}")
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "were", "can", "could",
+    "which", "allows", "allow", "via", "has", "have", "been", "not", "when", "may", "might",
+    "into", "other", "than", "through", "before", "after", "due", "its", "their", "there",
+    "attacker", "attackers", "vulnerability", "vulnerabilities", "issue", "version", "versions",
+}
+
+
+class PrefixIndex:
+    """
+    Immutable prefix index over a sorted key array.
+
+    ``bisect`` finds the block of keys sharing a prefix in O(log n); the
+    top entries of that block by weight are memoized per prefix, so repeat
+    keystrokes cost a dictionary lookup.
+    """
+
+    def __init__(self, entries: Dict[str, Tuple[str, float]]):
+        self._keys = sorted(entries)
+        self._display = [entries[key][0] for key in self._keys]
+        self._weights = [entries[key][1] for key in self._keys]
+        self.top = lru_cache(maxsize=4096)(self._top)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _top(self, prefix: str, limit: int) -> List[Tuple[str, float]]:
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + "\uffff")
+        best = heapq.nlargest(limit, range(lo, hi), key=self._weights.__getitem__)
+        return [(self._display[i], self._weights[i]) for i in best]
+
+
+class SuggestService:
+    """
+    Typeahead over CVE IDs and description keywords, rebuilt from the index
+    whenever ingestion bumps its generation. Until a rebuild finishes, the
+    previous index keeps answering.
+    """
+
+    def __init__(self, index_name: str = "asrg-cve"):
+        self.index_name = index_name
+        self._cves: Optional[PrefixIndex] = None
+        self._terms: Optional[PrefixIndex] = None
+        self._generation: Optional[int] = None
+        self._rebuild: Optional[asyncio.Task] = None
+        self._retry_at = 0.0
+
+    async def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        prefix = prefix.strip().lower()
+        if len(prefix) < MIN_PREFIX:
+            return []
+
+        await self._ensure_current()
+        if prefix.startswith("cve"):
+            if self._cves is None:
+                return []
+            return [{"text": text, "type": "cve"} for text, _ in self._cves.top(prefix, limit)]
+        if self._terms is None:
+            return []
+        return [
+            {"text": text, "type": "keyword", "count": int(weight)}
+            for text, weight in self._terms.top(prefix, limit)
+        ]
+
+    async def warm(self) -> None:
+        """Build the index ahead of the first keystroke (called at startup)."""
+        try:
+            await self._ensure_current()
+            if self._rebuild is not None:
+                await asyncio.shield(self._rebuild)
+        except Exception as e:
+            logger.warning(f"Suggestion index warm-up failed: {e}")
+
+    async def _ensure_current(self) -> None:
+        """
+        Start a rebuild in the background when the index generation moved.
+        Never waits for it: until a build finishes, the previous index (or
+        nothing) answers, and a failed build is not retried for BUILD_RETRY_AFTER.
+        """
+        generation = await index_generation(self.index_name)
+        if generation == self._generation:
+            return
+        if (self._rebuild is None or self._rebuild.done()) and time.monotonic() >= self._retry_at:
+            self._rebuild = asyncio.create_task(self._build(generation))
+
+    async def _build(self, generation: int) -> None:
+        cves: Dict[str, Tuple[str, float]] = {}
+        term_counts: Counter = Counter()
+        count = 0
+        try:
+            async for doc in cve_service.iter_documents(fields=["name", "description", "created"]):
+                name = doc.get("name")
+                if name:
+                    cves[name.lower()] = (name, _timestamp(doc.get("created")))
+                description = (doc.get("description") or "").lower()
+                term_counts.update({w for w in _word_re.findall(description) if w not in _STOPWORDS})
+                count += 1
+        except Exception as e:
+            logger.error(f"Could not build suggestion index for '{self.index_name}': {e}")
+            self._retry_at = time.monotonic() + BUILD_RETRY_AFTER
+            return
+
+        # Newest CVEs first; keywords by number of documents mentioning them
+        self._cves = PrefixIndex(cves)
+        self._terms = PrefixIndex({term: (term, n) for term, n in term_counts.items() if n > 1})
+        self._generation = generation
+        logger.info(f"Built suggestion index from {count} documents: {len(self._cves)} CVEs, {len(self._terms)} terms")
+
+
+def _timestamp(value: Optional[str]) -> float:
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+suggest_service = SuggestService()
@@ -1,71 +1,162 @@
-import re
+import base64
 from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
 import httpx
-from typing import Tuple
 from app.core.config import settings
-from app.core.elasticsearch_client import es
+from app.core.elasticsearch_client import async_es
+from app.core.http_client import get_http_client
+from app.core.singleflight import SingleFlight
+from app.services.ioc_cache import ioc_cache
+from app.services.ioc_engine import classify, HASH_TYPES
+from app.services.ioc_freshness import is_stale, record_hit, schedule_refresh
+from app.services.ioc_projection import compact_entry, compress_raw, project_vt, render_entry
+from app.services.ioc_utils import normalize_ioc, ioc_doc_id
+from app.services.vt_scheduler import vt_scheduler, PRIORITY_INTERACTIVE, PRIORITY_BULK
 
 VT_BASE = "https://www.virustotal.com/api/v3"
+VT_INDEX = "vt-iocs"
 
-_hash_re = re.compile(r"^[A-Fa-f0-9]{32}$|^[A-Fa-f0-9]{40}$|^[A-Fa-f0-9]{64}$")
-_ipv4_re = re.compile(r"^(?:\d{1,3}\.){3}\d{1,3}$")
-_email_re = re.compile(r"^[^@]+@[^@]+\.[^@]+$")
+# Concurrent lookups of the same IOC share one upstream request. Requests can sit
+# in the quota scheduler's queue for a while, so followers wait longer than for OTX
+# (the leader keeps its lock alive meanwhile), and interactive lookups in other
+# workers do not wait on a queued bulk fetch.
+vt_singleflight = SingleFlight(
+    "virustotal",
+    distributed=settings.ioc_singleflight_distributed,
+    lock_ttl=300,
+    wait_timeout=300.0
+)
+
+# Most urgent priority asked for by the callers of each fetch in flight in this
+# worker: an interactive caller joining a queued bulk fetch promotes it
+_flight_priority: Dict[str, int] = {}
 
 def _detect_vt_endpoint(ioc: str) -> Tuple[str, str]:
-    if _hash_re.match(ioc):
+    match = classify(ioc)
+    kind = match.type if match is not None else "domain"
+    if kind in HASH_TYPES:
         return ("files", ioc)
-    if _ipv4_re.match(ioc):
+    if kind in ("ipv4", "ipv6"):
         return ("ip_addresses", ioc)
-    if _email_re.match(ioc):
+    if kind == "url":
+        # VT URL identifiers are the unpadded URL-safe base64 of the URL
+        return ("urls", base64.urlsafe_b64encode(ioc.encode("utf-8")).decode("ascii").rstrip("="))
+    if kind == "email":
         return ("search", f"email:{ioc}")
+    if kind == "cve":
+        return ("search", ioc)
     return ("domains", ioc)
 
-def get_info_from_virustotal(ioc: str) -> dict:
-    """Get IOC data from VirusTotal, using Elasticsearch as a cache."""
-    # 1️⃣ Check cache first
+def vt_doc_id(ioc: str) -> str:
+    return ioc_doc_id(ioc, _detect_vt_endpoint(ioc)[0])
+
+async def lookup_vt_cache(ioc: str) -> Optional[dict]:
+    """Return the cached VirusTotal entry for the IOC (L1/L2, then ES), or None on a miss."""
+    entry = await ioc_cache.get("virustotal", ioc)
+    if entry is not None:
+        return entry
+
     try:
-        query = {"query": {"match": {"ioc": ioc}}}
-        res = es.search(index="vt-iocs", body=query)
-        if res.get("hits", {}).get("total", {}).get("value", 0) > 0:
-            return res["hits"]["hits"][0]["_source"]["raw"]
+        res = await async_es.get(index=VT_INDEX, id=vt_doc_id(ioc), source_excludes=["raw_gz"])
+        entry = compact_entry(res["_source"])
+        await ioc_cache.set("virustotal", ioc, entry)
+        return entry
     except Exception:
-        pass
+        pass  # Not cached (404) or ES failure
+    return None
 
-    # 2️⃣ Fetch from API
+async def _fetch_from_virustotal(ioc: str, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """Fetch IOC data from the VirusTotal API and store it in the Elasticsearch cache."""
     api_key = getattr(settings, "virustotal_api_key", None)
     if not api_key:
-        return {"error": "VirusTotal API key not configured."}
+        return {"ioc": ioc, "source": "virustotal", "summary": {"error": "VirusTotal API key not configured."}}
 
     headers = {"x-apikey": api_key}
     path, ident = _detect_vt_endpoint(ioc)
 
-    url = f"{VT_BASE}/search?query={httpx.utils.quote(ident)}" if path == "search" else f"{VT_BASE}/{path}/{ident}"
+    if path == "search":
+        url, params = f"{VT_BASE}/search", {"query": ident}
+    else:
+        url, params = f"{VT_BASE}/{path}/{ident}", None
 
     try:
-        resp = httpx.get(url, headers=headers, timeout=15)
+        resp = await vt_scheduler.submit(
+            lambda: get_http_client().get(url, headers=headers, params=params),
+            priority=min(priority, _flight_priority.get(ioc, priority)),
+            key=ioc
+        )
         resp.raise_for_status()
         result = resp.json()
 
-        # Save in ES
-        doc = {
+        # Save in ES: a compact summary plus the compressed full response
+        entry = {
             "ioc": ioc,
             "type": path,
             "source": "virustotal",
             "fetched_at": datetime.utcnow().isoformat(),
-            "raw": result
+            "summary": project_vt(result)
         }
         try:
-            es.index(index="vt-iocs", document=doc)
+            await async_es.index(
+                index=VT_INDEX,
+                id=ioc_doc_id(ioc, path),
+                document={**entry, "raw_gz": compress_raw(result)}
+            )
         except Exception:
             pass
+        await ioc_cache.set("virustotal", ioc, entry)
 
-        return result
+        return entry
 
     except httpx.HTTPStatusError as e:
         try:
             details = e.response.json()
         except Exception:
             details = e.response.text
-        return {"error": f"VirusTotal API error: {e.response.status_code}", "details": details}
+        error = {"error": f"VirusTotal API error: {e.response.status_code}", "details": details}
+        if e.response.status_code == 404:
+            await ioc_cache.set_negative("virustotal", ioc, error)
+        return {"ioc": ioc, "source": "virustotal", "summary": error}
     except Exception as e:
-        return {"error": str(e)}
+        return {"ioc": ioc, "source": "virustotal", "summary": {"error": str(e)}}
+
+async def fetch_from_virustotal(ioc: str, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """
+    Fetch IOC data from VirusTotal, sharing one upstream request between concurrent callers.
+    A caller joining a fetch that was queued at a lower priority moves it up to its own.
+    """
+    fetch = lambda: _fetch_from_virustotal(ioc, priority)
+    shared_result = lambda: ioc_cache.get("virustotal", ioc)
+    if vt_singleflight.in_flight(ioc):
+        if priority < _flight_priority.get(ioc, priority):
+            _flight_priority[ioc] = priority
+            vt_scheduler.promote(ioc, priority)
+        return await vt_singleflight.do(ioc, fetch, shared_result=shared_result, priority=priority)
+
+    # This caller starts the fetch (nothing is awaited between the check and do())
+    _flight_priority[ioc] = priority
+    try:
+        return await vt_singleflight.do(ioc, fetch, shared_result=shared_result, priority=priority)
+    finally:
+        _flight_priority.pop(ioc, None)
+
+async def get_vt_entry(ioc: str, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """Return the cache entry for a normalized IOC, fetching it from VirusTotal on a miss."""
+    # 1️⃣ Check cache first
+    cached = await lookup_vt_cache(ioc)
+    if cached is not None:
+        record_hit("virustotal", ioc)
+        # Serve expired entries immediately and refresh them in the background
+        if is_stale(cached):
+            schedule_refresh("virustotal", ioc, lambda: fetch_from_virustotal(ioc, PRIORITY_BULK))
+        return cached
+
+    # 2️⃣ Fetch from API
+    return await fetch_from_virustotal(ioc, priority)
+
+async def get_info_from_virustotal(ioc: str, priority: int = PRIORITY_INTERACTIVE,
+                                   full: bool = False, fields: Optional[Iterable[str]] = None) -> dict:
+    """Get IOC data from VirusTotal, using the IOC cache tiers and Elasticsearch."""
+    ioc = normalize_ioc(ioc)
+    entry = await get_vt_entry(ioc, priority)
+    return await render_entry(entry, VT_INDEX, vt_doc_id(ioc), full=full, fields=fields)
@@ -0,0 +1,256 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+from app.core.config import settings
+from app.core.redis_client import redis_client, redis_available, mark_redis_failure
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+MAX_RATE_LIMIT_RETRIES = 3
+
+# Shared token bucket. Returns "0" when a token was taken, otherwise the number
+# of seconds until one becomes available (as a string, Lua numbers are truncated).
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) * 2)
+return tostring(wait)
+"""
+
+
+class VTQuotaExceeded(Exception):
+    """Raised when the VirusTotal daily quota is used up."""
+
+
+class _LocalTokenBucket:
+    """In-process fallback for when Redis is unavailable."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.ts = time.monotonic()
+
+    def take(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def drain(self) -> None:
+        self.tokens = 0
+        self.ts = time.monotonic()
+
+
+class VTScheduler:
+    """
+    Quota-aware dispatcher for VirusTotal API calls.
+
+    Requests wait in a priority queue and are released one token at a time
+    from a token bucket shared by all workers through Redis, so interactive
+    lookups overtake queued bulk enrichment and the per-minute quota is never
+    exceeded. A daily counter enforces the per-day quota, and 429 responses
+    pause dispatching and re-queue the request instead of reaching the user.
+    """
+
+    def __init__(self, requests_per_minute: int, requests_per_day: int):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1, requests_per_minute)
+        self.requests_per_day = requests_per_day
+        self._local_bucket = _LocalTokenBucket(self.rate, self.capacity)
+        self._local_daily: Tuple[str, int] = ("", 0)
+        self._queue: List[tuple] = []
+        # Heap entry of each waiting request submitted with a key, for promote()
+        self._queued: Dict[str, tuple] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self._waits: Dict[int, Dict[str, float]] = {}
+        self.rate_limited = 0
+        self.quota_rejections = 0
+
+    async def submit(self, fn: Callable[[], Awaitable[httpx.Response]],
+                     priority: int = PRIORITY_INTERACTIVE, key: Optional[str] = None) -> httpx.Response:
+        """
+        Run ``fn`` (one VT API call) once the quota allows, honouring priority.
+        A ``key`` lets promote() move the request ahead while it waits.
+        """
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            future = asyncio.get_running_loop().create_future()
+            self._enqueue(priority, time.monotonic(), future, key)
+            try:
+                await future
+            finally:
+                if key is not None and key in self._queued:
+                    # Retries keep any promotion
+                    priority = self._queued.pop(key)[0]
+            response = await fn()
+            if response.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+                return response
+
+            self.rate_limited += 1
+            retry_after = float(response.headers.get("Retry-After", 60 / max(self.rate * 60, 1)))
+            logger.warning(f"VirusTotal returned 429, pausing dispatch for {retry_after:.0f}s")
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._local_bucket.drain()
+        return response
+
+    def promote(self, key: str, priority: int) -> None:
+        """Raise the request waiting under ``key`` to ``priority`` if that is ahead of its own."""
+        entry = self._queued.get(key)
+        if entry is None or priority >= entry[0] or entry[3].done():
+            return
+        # The old heap entry stays behind and is skipped once the future is resolved
+        self._enqueue(priority, entry[2], entry[3], key)
+
+    def _enqueue(self, priority: int, enqueued_at: float, future: asyncio.Future, key: Optional[str]) -> None:
+        entry = (priority, next(self._seq), enqueued_at, future)
+        heapq.heappush(self._queue, entry)
+        if key is not None:
+            self._queued[key] = entry
+        self._wakeup.set()
+        self._ensure_dispatcher()
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        # A granted token not used yet, because every waiter went away meanwhile
+        holding_token = False
+        while True:
+            # Requests whose callers went away are dropped before they cost a token
+            while self._queue and self._queue[0][3].done():
+                heapq.heappop(self._queue)
+            while not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+
+            if not holding_token:
+                wait = await self._take_token()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+
+            # Pop only after the token is granted, so late interactive requests jump ahead
+            item = self._pop_waiting()
+            holding_token = item is None
+            if item is None:
+                continue
+            priority, _, enqueued_at, future = item
+            self._record_wait(priority, time.monotonic() - enqueued_at)
+
+            try:
+                await self._count_daily()
+            except VTQuotaExceeded as e:
+                self.quota_rejections += 1
+                future.set_exception(e)
+                continue
+            future.set_result(None)
+
+    def _pop_waiting(self) -> Optional[tuple]:
+        while self._queue:
+            item = heapq.heappop(self._queue)
+            if not item[3].done():
+                return item
+        return None
+
+    async def _take_token(self) -> float:
+        if redis_available():
+            try:
+                wait = await redis_client.eval(
+                    _TOKEN_BUCKET_SCRIPT, 1, "vt-scheduler:bucket",
+                    self.rate, self.capacity, time.time()
+                )
+                return float(wait)
+            except Exception as e:
+                mark_redis_failure(e)
+        return self._local_bucket.take()
+
+    async def _count_daily(self) -> None:
+        day = datetime.now(timezone.utc).strftime("%Y%m%d")
+        used = None
+        if redis_available():
+            try:
+                key = f"vt-scheduler:daily:{day}"
+                used = await redis_client.incr(key)
+                if used == 1:
+                    await redis_client.expire(key, 2 * 86400)
+            except Exception as e:
+                mark_redis_failure(e)
+        if used is None:
+            local_day, count = self._local_daily
+            used = count + 1 if local_day == day else 1
+            self._local_daily = (day, used)
+        if used > self.requests_per_day:
+            raise VTQuotaExceeded(f"VirusTotal daily quota of {self.requests_per_day} requests exhausted")
+
+    def _record_wait(self, priority: int, waited: float) -> None:
+        stats = self._waits.setdefault(priority, {"count": 0, "total": 0.0, "max": 0.0})
+        stats["count"] += 1
+        stats["total"] += waited
+        stats["max"] = max(stats["max"], waited)
+
+    def stats(self) -> dict:
+        depth: Dict[int, int] = {}
+        counted = set()
+        # Ascending priority, so a promoted request is counted once, at its new priority
+        for priority, _, _, future in sorted(self._queue, key=lambda entry: entry[:2]):
+            if not future.done() and id(future) not in counted:
+                counted.add(id(future))
+                depth[priority] = depth.get(priority, 0) + 1
+        return {
+            "requests_per_minute": self.rate * 60,
+            "requests_per_day": self.requests_per_day,
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "wait_seconds_by_priority": {
+                priority: {
+                    "count": s["count"],
+                    "avg": s["total"] / s["count"] if s["count"] else 0.0,
+                    "max": s["max"]
+                }
+                for priority, s in self._waits.items()
+            },
+            "rate_limited": self.rate_limited,
+            "quota_rejections": self.quota_rejections,
+            "paused": self._paused_until > time.monotonic()
+        }
+
+    async def close(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+
+vt_scheduler = VTScheduler(settings.vt_requests_per_minute, settings.vt_requests_per_day)
@@ -0,0 +1,85 @@
+import re
+from typing import Dict, Iterable, List, Optional
+from elasticsearch import helpers
+from elasticsearch.exceptions import NotFoundError
+from app.core.elasticsearch_client import es
+from app.services.embedded_search import rebuild_snapshot
+from app.services.search_cache import bump_index_generation
+
+ZERODAY_INDEX = "zeroday"
+
+# Fields of a VicOne zero-day entry copied onto the CVE documents
+ZERODAY_FIELDS = ["zero_day_id", "category", "impact"]
+
+# The scraped "cve" column is free text and may name several CVEs (or none)
+_cve_re = re.compile(r"CVE-\d{4}-\d{4,}", re.IGNORECASE)
+
+
+def build_zeroday_map(records: Optional[Iterable[Dict]] = None) -> Dict[str, List[Dict]]:
+    """
+    Map each CVE ID to the zero-day entries that mention it.
+
+    ``records`` are scraped zero-day rows; when omitted they are read from the
+    zeroday index.
+    """
+    if records is None:
+        try:
+            records = [hit["_source"] for hit in helpers.scan(es, index=ZERODAY_INDEX, query={"query": {"match_all": {}}})]
+        except NotFoundError:
+            return {}
+        except Exception as e:
+            # Enrichment is best effort and never blocks ingestion
+            print(f"Could not read zero-day entries: {e}")
+            return {}
+
+    zeroday_map: Dict[str, List[Dict]] = {}
+    for record in records:
+        entry = {field: record.get(field) for field in ZERODAY_FIELDS}
+        for cve_id in set(match.upper() for match in _cve_re.findall(record.get("cve") or "")):
+            entries = zeroday_map.setdefault(cve_id, [])
+            # Repeated scrapes index the same row again
+            if entry not in entries:
+                entries.append(entry)
+    return zeroday_map
+
+
+def enrich_cve_index(zeroday_map: Dict[str, List[Dict]], index_name: str = "asrg-cve") -> Dict:
+    """
+    Bulk partial-update the CVE documents named in ``zeroday_map`` with their
+    zero-day entries. CVE documents are keyed by CVE ID, so CVEs that are not
+    in the index are simply reported as missing. The embedded search snapshot,
+    which answers exact CVE-ID searches, is rebuilt to carry the new entries.
+    """
+    if not zeroday_map:
+        return {"updated": 0, "missing": 0}
+
+    actions = (
+        {"_op_type": "update", "_index": index_name, "_id": cve_id, "doc": {"zero_day": entries}}
+        for cve_id, entries in zeroday_map.items()
+    )
+    updated, errors = helpers.bulk(es, actions, raise_on_error=False, raise_on_exception=False)
+
+    missing = 0
+    for error in errors:
+        if error.get("update", {}).get("status") == 404:
+            missing += 1
+        else:
+            print(f"Error enriching {error.get('update', {}).get('_id')} with zero-day data: {error}")
+
+    if updated:
+        es.indices.refresh(index=index_name)
+        bump_index_generation(index_name)
+        try:
+            print(f"Wrote embedded search snapshot with {rebuild_snapshot(index_name)} documents")
+        except Exception as e:
+            print(f"Could not rebuild the embedded search snapshot: {e}")
+    print(f"Enriched {updated} CVE documents in {index_name} with zero-day data ({missing} CVEs not indexed)")
+    return {"updated": updated, "missing": missing}
+
+
+def attach_zero_days(doc: Dict, zeroday_map: Dict[str, List[Dict]]) -> Dict:
+    """Ingestion-side join: add the zero-day entries for ``doc`` before it is indexed"""
+    entries = zeroday_map.get((doc.get("name") or "").upper())
+    if entries:
+        doc["zero_day"] = entries
+    return doc
@@ -0,0 +1,7 @@
+import os
+
+# Settings() requires these; the tests never reach the real services
+os.environ.setdefault("ELASTIC_HOST", "http://localhost:9200")
+os.environ.setdefault("REDIS_HOST", "localhost")
+os.environ.setdefault("OTX_API_KEY", "test")
+os.environ.setdefault("VIRUSTOTAL_API_KEY", "test")
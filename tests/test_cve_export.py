@@ -0,0 +1,65 @@
+import asyncio
+import gzip
+import json
+import pytest
+from elasticsearch.exceptions import NotFoundError
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.routes import cve_router
+from app.services import cve_service as cve_module
+from app.services.export_service import export_cves, INTERRUPTED_MESSAGE
+
+
+class FailingES:
+    """Opens a point in time, then fails after the first batch of an export"""
+
+    def __init__(self, open_error=None):
+        self.open_error = open_error
+        self.searches = 0
+
+    async def open_point_in_time(self, index, keep_alive):
+        if self.open_error is not None:
+            raise self.open_error
+        return {"id": "pit-1"}
+
+    async def close_point_in_time(self, id):
+        return {}
+
+    async def search(self, search_after=None, size=10, **kwargs):
+        self.searches += 1
+        if self.searches > 1:
+            raise ConnectionError("node went away")
+        hits = [{"_source": {"name": f"CVE-2024-000{i}"}, "sort": [i]} for i in range(size)]
+        return {"pit_id": "pit-1", "hits": {"hits": hits}}
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(cve_router.router, prefix="/api/cve")
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("error, status", [
+    (NotFoundError("index_not_found_exception", None, {}), 404),
+    (ConnectionError("refused"), 503),
+])
+def test_export_reports_backend_failures_before_streaming(client, monkeypatch, error, status):
+    monkeypatch.setattr(cve_module, "async_es", FailingES(open_error=error))
+    assert client.get("/api/cve/export").status_code == status
+
+
+def test_export_failing_part_way_ends_with_an_error_record(monkeypatch):
+    monkeypatch.setattr(cve_module, "async_es", FailingES())
+
+    async def scenario():
+        original = cve_module.cve_service.iter_documents
+
+        def small_batches(query, fields=None, pit_id=None):
+            return original(query, fields=fields, batch_size=2, pit_id=pit_id)
+
+        monkeypatch.setattr(cve_module.cve_service, "iter_documents", small_batches)
+        return b"".join([chunk async for chunk in export_cves("")])
+
+    lines = [json.loads(line) for line in gzip.decompress(asyncio.run(scenario())).splitlines()]
+    assert lines == [{"name": "CVE-2024-0000"}, {"name": "CVE-2024-0001"}, {"error": INTERRUPTED_MESSAGE}]
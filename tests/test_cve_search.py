@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+from app.services import cve_service as cve_module
+from app.services.cve_service import CVEService
+from app.services.search_cache import search_result_cache
+
+
+class FakeES:
+    """Just enough of AsyncElasticsearch for cursor pagination over a fixed hit list"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.searches = 0
+        self.closed = []
+
+    async def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit-1"}
+
+    async def close_point_in_time(self, id):
+        self.closed.append(id)
+        return {}
+
+    async def search(self, query=None, pit=None, sort=None, size=10, source=None, search_after=None, **kwargs):
+        self.searches += 1
+        start = search_after[0] + 1 if search_after else 0
+        hits = [{"_source": doc, "sort": [position]} for position, doc in enumerate(self.docs)][start:start + size]
+        return {"pit_id": pit["id"], "hits": {"total": {"value": len(self.docs)}, "hits": hits}}
+
+
+@pytest.fixture
+def fake_es(monkeypatch):
+    es = FakeES([{"name": f"CVE-2024-000{i}"} for i in range(5)])
+    monkeypatch.setattr(cve_module, "async_es", es)
+    search_result_cache.results.clear()
+    return es
+
+
+def test_cursor_from_cached_page_works_for_query_spelled_differently(fake_es):
+    service = CVEService("test-cursor-index")
+
+    async def scenario():
+        first = await service.search("mercedes", page_size=2, cursor="*")
+        # Served from the cache entry of the first search, including its cursor
+        cached = await service.search("  Mercedes ", page_size=2, cursor="*")
+        assert cached["pagination"]["next_cursor"] == first["pagination"]["next_cursor"]
+        assert fake_es.searches == 1
+        return await service.search("Mercedes", page_size=2, cursor=cached["pagination"]["next_cursor"])
+
+    second = asyncio.run(scenario())
+    assert [doc["name"] for doc in second["results"]] == ["CVE-2024-0002", "CVE-2024-0003"]
+
+
+def test_cursor_rejected_for_another_query(fake_es):
+    service = CVEService("test-cursor-index")
+
+    async def scenario():
+        first = await service.search("mercedes", page_size=2, cursor="*")
+        await service.search("tesla", page_size=2, cursor=first["pagination"]["next_cursor"])
+
+    with pytest.raises(ValueError, match="Cursor does not belong to this query"):
+        asyncio.run(scenario())
+
+
+def test_last_cursor_page_leaves_the_shared_pit_open(fake_es):
+    service = CVEService("test-cursor-index")
+
+    async def scenario():
+        cursor = "*"
+        while cursor is not None:
+            page = await service.search("mercedes", page_size=2, cursor=cursor)
+            cursor = page["pagination"]["next_cursor"]
+        # A second client is served the cached first page and follows its cursor
+        cached = await service.search("mercedes", page_size=2, cursor="*")
+        return await service.search("mercedes", page_size=2, cursor=cached["pagination"]["next_cursor"])
+
+    second = asyncio.run(scenario())
+    assert [doc["name"] for doc in second["results"]] == ["CVE-2024-0002", "CVE-2024-0003"]
+    assert fake_es.closed == []
+
+
+def test_no_empty_last_page_when_total_is_a_multiple_of_the_page_size(monkeypatch):
+    es = FakeES([{"name": f"CVE-2024-000{i}"} for i in range(4)])
+    monkeypatch.setattr(cve_module, "async_es", es)
+    search_result_cache.results.clear()
+    service = CVEService("test-cursor-index")
+
+    async def scenario():
+        first = await service.search("mercedes", page_size=2, cursor="*")
+        return first, await service.search("mercedes", page_size=2, cursor=first["pagination"]["next_cursor"])
+
+    first, second = asyncio.run(scenario())
+    assert [doc["name"] for doc in second["results"]] == ["CVE-2024-0002", "CVE-2024-0003"]
+    assert first["pagination"]["has_next"] is True
+    assert second["pagination"]["has_next"] is False
+    assert second["pagination"]["next_cursor"] is None
@@ -0,0 +1,20 @@
+import asyncio
+from app.services import embedded_search
+from app.services.embedded_search import EmbeddedSearchIndex, write_snapshot
+
+
+def test_newer_snapshot_is_read_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedded_search.settings, "cve_snapshot_dir", str(tmp_path))
+    write_snapshot("asrg-cve", [{"name": "CVE-2024-0001", "description": "old"}])
+    index = EmbeddedSearchIndex("asrg-cve")
+
+    async def scenario():
+        assert await index.aload()
+        write_snapshot("asrg-cve", [{"name": "CVE-2024-0001", "description": "new"}])
+        index._checked_at = 0.0
+        # The loaded snapshot answers while the new one is read in a thread
+        before = index.get("CVE-2024-0001")["description"]
+        await index._reload_task
+        return before, index.get("CVE-2024-0001")["description"]
+
+    assert asyncio.run(scenario()) == ("old", "new")
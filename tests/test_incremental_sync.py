@@ -0,0 +1,77 @@
+import time
+import pytest
+from app.services import asrg_vuldb_service
+from app.services.asrg_vuldb_service import ASRGVulnerabilityService
+from app.services.ingest_state import FeedWatermark, full_sync_due
+
+
+def _ago(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - seconds))
+
+
+def test_watermark_positions_around_the_boundary():
+    watermark = FeedWatermark()
+    for vuln in [
+        {"name": "CVE-3", "created": "2024-03-01T00:00:00.000Z"},
+        {"name": "CVE-2", "created": "2024-03-01T00:00:00.000Z"},
+        {"name": "CVE-1", "created": "2024-02-01T00:00:00Z"},
+    ]:
+        watermark.observe(vuln)
+    previous = FeedWatermark.from_state(watermark.to_state())
+
+    assert previous.position({"name": "CVE-5", "created": "2024-04-01T00:00:00Z"}) == "new"
+    assert previous.position({"name": "CVE-4", "created": "2024-03-01T00:00:00Z"}) == "new"
+    assert previous.position({"name": "CVE-3", "created": "2024-03-01T00:00:00Z"}) == "seen"
+    assert previous.position({"name": "CVE-1", "created": "2024-02-01T00:00:00Z"}) == "older"
+
+
+@pytest.mark.parametrize("state, interval, due", [
+    ({"last_full_sync": _ago(60)}, 86400, False),
+    ({"last_full_sync": _ago(90000)}, 86400, True),
+    ({}, 86400, True),
+    ({}, 0, False),
+])
+def test_full_sync_due(state, interval, due):
+    assert full_sync_due(state, interval) is due
+
+
+@pytest.fixture
+def sync(monkeypatch):
+    calls = {"full": 0, "pages": 0, "saved": None}
+
+    def fetch_and_index(search_term):
+        calls["full"] += 1
+        return {"status": "success", "mode": "full"}
+
+    def pages(search_term):
+        calls["pages"] += 1
+        yield [{"name": "CVE-2024-0009", "created": "2024-05-01T00:00:00Z", "relevance": False}]
+        yield [{"name": "CVE-2024-0001", "created": "2024-01-01T00:00:00Z", "relevance": True}]
+        raise AssertionError("pagination must stop at the watermark")
+
+    monkeypatch.setattr(ASRGVulnerabilityService, "fetch_and_index", classmethod(lambda cls, term: fetch_and_index(term)))
+    monkeypatch.setattr(ASRGVulnerabilityService, "iter_vulnerability_pages", staticmethod(pages))
+    monkeypatch.setattr(ASRGVulnerabilityService, "_live_version", staticmethod(lambda alias: "asrg-cve-v20240101000000"))
+    monkeypatch.setattr(asrg_vuldb_service, "save_state", lambda key, state: calls.update(saved=state))
+    return calls
+
+
+def test_incremental_sync_stops_at_watermark(sync, monkeypatch):
+    state = {"watermark_created": "2024-02-01T00:00:00Z", "boundary_ids": ["CVE-2024-0002"], "last_full_sync": _ago(60)}
+    monkeypatch.setattr(asrg_vuldb_service, "load_state", lambda key: state)
+
+    result = ASRGVulnerabilityService.sync_incremental("cve")
+
+    assert result["mode"] == "incremental"
+    assert result["pages_fetched"] == 2 and result["new_in_api"] == 1
+    assert sync["full"] == 0
+    assert sync["saved"]["watermark_created"] == "2024-05-01T00:00:00Z"
+    assert sync["saved"]["last_full_sync"] == state["last_full_sync"]
+
+
+def test_incremental_sync_runs_full_when_last_rebuild_is_old(sync, monkeypatch):
+    state = {"watermark_created": "2024-02-01T00:00:00Z", "boundary_ids": [], "last_full_sync": _ago(10 * 86400)}
+    monkeypatch.setattr(asrg_vuldb_service, "load_state", lambda key: state)
+
+    assert ASRGVulnerabilityService.sync_incremental("cve")["mode"] == "full"
+    assert sync["full"] == 1 and sync["pages"] == 0
@@ -0,0 +1,98 @@
+import pytest
+from app.services import asrg_vuldb_service
+from app.services.asrg_vuldb_service import ASRGVulnerabilityService
+
+
+class FakeIndices:
+    def __init__(self, es):
+        self.es = es
+
+    def create(self, index, **kwargs):
+        self.es.docs[index] = {}
+
+    def put_settings(self, **kwargs):
+        pass
+
+    def refresh(self, **kwargs):
+        pass
+
+    def exists(self, index):
+        return index in self.es.docs
+
+    def delete(self, index, **kwargs):
+        self.es.docs.pop(index, None)
+        self.es.deleted.append(index)
+
+
+class FakeES:
+    """Indices hold their documents by _id, so a repeated _id overwrites"""
+
+    def __init__(self, live=0):
+        self.docs = {}
+        self.deleted = []
+        if live:
+            self.docs["asrg-cve"] = {f"live-{n}": {} for n in range(live)}
+        self.indices = FakeIndices(self)
+
+    def count(self, index):
+        return {"count": len(self.docs[index])}
+
+
+class FakeSnapshot:
+    def __init__(self, name):
+        self.docs = []
+        self.state = "open"
+
+    def add(self, doc):
+        self.docs.append(doc)
+
+    def close(self):
+        self.state = "closed"
+        return len(self.docs)
+
+    def abort(self):
+        self.state = "aborted"
+
+
+@pytest.fixture
+def ingest(monkeypatch):
+    def run(vulnerabilities, live=0):
+        es = FakeES(live)
+
+        def parallel_bulk(client, actions, **kwargs):
+            for n, action in enumerate(actions):
+                doc_id = action.get("_id", f"auto-{n}")
+                result = "updated" if doc_id in es.docs[action["_index"]] else "created"
+                es.docs[action["_index"]][doc_id] = action["_source"]
+                yield True, {"index": {"_id": doc_id, "result": result, "status": 201}}
+
+        swaps = []
+        monkeypatch.setattr(asrg_vuldb_service, "es", es)
+        monkeypatch.setattr(asrg_vuldb_service.helpers, "parallel_bulk", parallel_bulk)
+        monkeypatch.setattr(asrg_vuldb_service, "ensure_index_templates_sync", lambda client: None)
+        monkeypatch.setattr(asrg_vuldb_service, "build_zeroday_map", lambda: {})
+        monkeypatch.setattr(asrg_vuldb_service, "SnapshotWriter", FakeSnapshot)
+        monkeypatch.setattr(ASRGVulnerabilityService, "_swap_alias", classmethod(lambda cls, alias, index: swaps.append(index)))
+        monkeypatch.setattr(ASRGVulnerabilityService, "_prune_versions", classmethod(lambda cls, alias, keep: None))
+        result = ASRGVulnerabilityService.index_vulnerabilities("cve", vulnerabilities)
+        return result, es, swaps
+    return run
+
+
+def test_repeated_cves_do_not_block_the_swap(ingest):
+    result, es, swaps = ingest([{"name": "CVE-2024-0002"}, {"name": "CVE-2024-0001"}, {"name": "CVE-2024-0002"}])
+
+    assert result["status"] == "success"
+    assert result["documents_indexed"] == 2
+    assert result["duplicate_documents"] == 1
+    assert swaps == [result["version"]]
+
+
+def test_short_index_is_not_swapped_in(ingest, monkeypatch):
+    monkeypatch.setattr(asrg_vuldb_service.settings, "asrg_min_doc_ratio", 0.5)
+    result, es, swaps = ingest([{"name": "CVE-2024-0001"}, {"name": "CVE-2024-0002"}], live=10)
+
+    assert result["status"] == "error"
+    assert "against 10 in the live index" in result["message"]
+    assert swaps == []
+    assert es.deleted and es.deleted[0].startswith("asrg-cve-v")
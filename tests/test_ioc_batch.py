@@ -0,0 +1,58 @@
+import asyncio
+from app.services import ioc_batch_service
+from app.services.ioc_sources import IOCSource
+
+
+def _patch_sources(monkeypatch, vt_release, vt_calls):
+    async def fetch_otx(ioc):
+        return {"summary": {"pulses": 1}}
+
+    async def fetch_vt(ioc):
+        vt_calls.append(ioc)
+        await vt_release.wait()
+        return {"summary": {"malicious": 0}}
+
+    async def no_cache(iocs):
+        return {ioc: {} for ioc in iocs}
+
+    monkeypatch.setattr(ioc_batch_service, "SOURCES", {
+        "otx": IOCSource("otx-iocs", str, None, fetch_otx),
+        "virustotal": IOCSource("vt-iocs", str, None, fetch_vt),
+    })
+    monkeypatch.setattr(ioc_batch_service, "_lookup_cached", no_cache)
+
+
+def test_otx_results_stream_before_virustotal(monkeypatch):
+    vt_calls = []
+
+    async def run():
+        vt_release = asyncio.Event()
+        _patch_sources(monkeypatch, vt_release, vt_calls)
+        results = []
+        async for result in ioc_batch_service.analyze_batch(["8.8.8.8", "1.1.1.1"]):
+            results.append(result)
+            if len(results) == 2:
+                vt_release.set()
+        return results
+
+    results = asyncio.run(run())
+    assert [sorted(r) for r in results[:2]] == [["ioc", "otx"], ["ioc", "otx"]]
+    assert [sorted(r) for r in results[2:]] == [["ioc", "virustotal"], ["ioc", "virustotal"]]
+
+
+def test_batch_spends_only_its_share_of_the_vt_quota(monkeypatch):
+    vt_calls = []
+    monkeypatch.setattr(ioc_batch_service.settings, "vt_requests_per_day", 10)
+    monkeypatch.setattr(ioc_batch_service.settings, "ioc_batch_vt_quota_share", 0.2)
+
+    async def run():
+        vt_release = asyncio.Event()
+        vt_release.set()
+        _patch_sources(monkeypatch, vt_release, vt_calls)
+        return [r async for r in ioc_batch_service.analyze_batch([f"10.0.0.{n}" for n in range(5)])]
+
+    results = asyncio.run(run())
+    vt_results = [r["virustotal"] for r in results if "virustotal" in r]
+    assert len(vt_calls) == 2
+    assert len(vt_results) == 5
+    assert sum("error" in r for r in vt_results) == 3
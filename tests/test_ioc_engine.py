@@ -0,0 +1,71 @@
+import pytest
+from app.services.ioc_engine import IOC, classify, extract_iocs, refang
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("hxxp://evil[.]com/a", "http://evil.com/a"),
+    ("HXXPS[://]evil.com", "https://evil.com"),
+    ("fxp[:]//files.example", "ftp://files.example"),
+    ("user[@]mail[.]example", "user@mail.example"),
+    ("1.2.3[.]4", "1.2.3.4"),
+    ("user(at)mail(dot)example", "user@mail.example"),
+    ("evil{.}com", "evil.com"),
+    ("10.0.0.1[:]8080", "10.0.0.1:8080"),
+])
+def test_refang_defanged(value, expected):
+    assert refang(value) == expected
+
+
+@pytest.mark.parametrize("value", [
+    "sfxpro.com",
+    "wfxp.net",
+    "http://shop.example/gifxparty",
+    "https://x.example/hxxp",
+    "hxxpool.example",
+])
+def test_refang_leaves_real_indicators_alone(value):
+    assert refang(value) == value
+
+
+@pytest.mark.parametrize("text", [
+    "meet [at] noon",
+    "see the note (.) below",
+    "Look {.} here",
+    "(at) least twice",
+    "[at]",
+    "the result [.]",
+    "ratio 1:2 [:] fine",
+])
+def test_refang_leaves_prose_alone(text):
+    assert refang(text) == text
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("sfxpro.com", IOC("domain", "sfxpro.com")),
+    ("wfxp.net", IOC("domain", "wfxp.net")),
+    ("http://shop.example/gifxparty", IOC("url", "http://shop.example/gifxparty")),
+    ("hxxps://Evil[.]com/x", IOC("url", "https://evil.com/x")),
+    ("8.8.8.8", IOC("ipv4", "8.8.8.8")),
+    ("2001:DB8:0::1", IOC("ipv6", "2001:db8::1")),
+    ("::ffff:1.2.3.4", IOC("ipv6", "::ffff:1.2.3.4")),
+    ("cve-2024-12345", IOC("cve", "CVE-2024-12345")),
+])
+def test_classify(value, expected):
+    assert classify(value) == expected
+
+
+def test_extract_across_chunks():
+    chunks = ["see hxxp://evil[.]com/pa", "th and 10.0.0.1, sfxpro.com\n", "10.0.0.1 again"]
+    assert list(extract_iocs(chunks)) == [
+        IOC("url", "http://evil.com/path"),
+        IOC("ipv4", "10.0.0.1"),
+        IOC("domain", "sfxpro.com"),
+    ]
+
+
+def test_extract_ipv6_with_ipv4_tail_and_drop_invalid_candidates():
+    text = "beacons to ::ffff:10.1.2.3 and fe80::1. Not an address: 1:2:3\n"
+    assert list(extract_iocs([text])) == [
+        IOC("ipv6", "::ffff:10.1.2.3"),
+        IOC("ipv6", "fe80::1"),
+    ]
@@ -0,0 +1,55 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.routes import ioc
+from app.models.ioc_models import MAX_BATCH_IOCS
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(ioc.router, prefix="/api/ioc")
+    return TestClient(app)
+
+
+def test_extract_streams_iocs_from_multipart_upload(client):
+    report = b"C2 at hxxp://evil[.]com/gate.php and 10.0.0.1\nmirror sfxpro.com, 10.0.0.1\n"
+    response = client.post("/api/ioc/extract", files={"file": ("report.txt", report, "text/plain")})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"type": "url", "value": "http://evil.com/gate.php"},
+        {"type": "ipv4", "value": "10.0.0.1"},
+        {"type": "domain", "value": "sfxpro.com"},
+    ]
+
+
+def test_extract_enrich_streams_batch_results(client, monkeypatch):
+    async def fake_analyze_batch(values, full=False, fields=None):
+        for value in values:
+            yield {"ioc": value}
+
+    monkeypatch.setattr(ioc, "analyze_batch", fake_analyze_batch)
+    response = client.post(
+        "/api/ioc/extract", params={"enrich": "true"},
+        files={"file": ("report.txt", b"8.8.8.8 evil[.]com", "text/plain")}
+    )
+
+    assert response.status_code == 200
+    assert [json.loads(line) for line in response.text.splitlines()] == [{"ioc": "8.8.8.8"}, {"ioc": "evil.com"}]
+
+
+def test_extract_enrich_rejects_oversized_reports(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("analyze_batch must not run")
+
+    monkeypatch.setattr(ioc, "analyze_batch", fail)
+    report = "\n".join(f"10.0.{i // 256}.{i % 256}" for i in range(MAX_BATCH_IOCS + 1)).encode()
+    response = client.post(
+        "/api/ioc/extract", params={"enrich": "true"},
+        files={"file": ("report.txt", report, "text/plain")}
+    )
+
+    assert response.status_code == 413
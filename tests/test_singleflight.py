@@ -0,0 +1,81 @@
+import asyncio
+from app.core import singleflight
+from app.core.singleflight import SingleFlight
+
+
+class FakeRedis:
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.extended = 0
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value.encode()
+        return True
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def exists(self, key):
+        return int(key in self.values)
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.values.get(key) != token.encode():
+            return 0
+        if "expire" in script:
+            self.extended += 1
+        else:
+            del self.values[key]
+        return 1
+
+
+def _flight(monkeypatch, redis, **kwargs):
+    monkeypatch.setattr(singleflight, "redis_client", redis)
+    monkeypatch.setattr(singleflight, "redis_available", lambda: True)
+    return SingleFlight("test", poll_interval=0.01, **kwargs)
+
+
+async def _no_shared_result():
+    return None
+
+
+def test_interactive_caller_does_not_wait_on_a_bulk_leader_elsewhere(monkeypatch):
+    flight = _flight(monkeypatch, FakeRedis({"singleflight:test:k": b"other|10"}), wait_timeout=5.0)
+
+    async def fetch():
+        return "fetched"
+
+    result = asyncio.run(flight.do("k", fetch, shared_result=_no_shared_result, priority=0))
+    assert result == "fetched"
+    assert flight.stats()["overtaken"] == 1
+
+
+def test_bulk_caller_waits_for_the_leader_elsewhere(monkeypatch):
+    flight = _flight(monkeypatch, FakeRedis({"singleflight:test:k": b"other|0"}), wait_timeout=5.0)
+
+    async def scenario():
+        async def shared_result():
+            return "shared" if ready.is_set() else None
+
+        ready = asyncio.Event()
+        task = asyncio.create_task(flight.do("k", lambda: None, shared_result=shared_result, priority=10))
+        await asyncio.sleep(0.05)
+        ready.set()
+        return await task
+
+    assert asyncio.run(scenario()) == "shared"
+    assert flight.stats()["overtaken"] == 0
+
+
+def test_leader_keeps_its_lock_alive_while_running(monkeypatch):
+    redis = FakeRedis()
+    flight = _flight(monkeypatch, redis, lock_ttl=0.03)
+
+    async def slow_fetch():
+        await asyncio.sleep(0.1)
+        return "fetched"
+
+    assert asyncio.run(flight.do("k", slow_fetch, shared_result=_no_shared_result, priority=10)) == "fetched"
+    assert redis.extended >= 2
+    assert redis.values == {}
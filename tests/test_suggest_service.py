@@ -0,0 +1,56 @@
+import asyncio
+from app.services import suggest_service as suggest_module
+from app.services.suggest_service import SuggestService
+
+
+class FakeCVEService:
+    def __init__(self, docs=None):
+        self.docs = docs
+        self.scans = 0
+
+    async def iter_documents(self, fields=None):
+        self.scans += 1
+        if self.docs is None:
+            raise ConnectionError("Elasticsearch is down")
+        for doc in self.docs:
+            yield doc
+
+
+def _service(monkeypatch, fake):
+    async def generation(index_name):
+        return 1
+
+    monkeypatch.setattr(suggest_module, "cve_service", fake)
+    monkeypatch.setattr(suggest_module, "index_generation", generation)
+    return SuggestService("test-suggest-index")
+
+
+def test_failed_build_backs_off_and_keystrokes_do_not_wait(monkeypatch):
+    fake = FakeCVEService()
+    service = _service(monkeypatch, fake)
+
+    async def scenario():
+        results = []
+        for prefix in ("cv", "cve", "cve-", "cve-2"):
+            results.append(await service.suggest(prefix))
+            await asyncio.sleep(0)
+        return results
+
+    assert asyncio.run(scenario()) == [[], [], [], []]
+    assert fake.scans == 1
+
+
+def test_suggestions_served_once_built(monkeypatch):
+    fake = FakeCVEService([
+        {"name": "CVE-2024-0001", "description": "telematics unit overflow", "created": "2024-01-01T00:00:00Z"},
+        {"name": "CVE-2024-0002", "description": "telematics gateway bypass", "created": "2024-02-01T00:00:00Z"},
+    ])
+    service = _service(monkeypatch, fake)
+
+    async def scenario():
+        await service.warm()
+        return await service.suggest("cve-2024"), await service.suggest("tele")
+
+    cves, terms = asyncio.run(scenario())
+    assert [s["text"] for s in cves] == ["CVE-2024-0002", "CVE-2024-0001"]
+    assert terms == [{"text": "telematics", "type": "keyword", "count": 2}]
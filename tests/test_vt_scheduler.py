@@ -0,0 +1,104 @@
+import asyncio
+import time
+import httpx
+from app.services.vt_scheduler import VTScheduler, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+def _call(order, name):
+    async def call():
+        order.append(name)
+        return httpx.Response(200)
+    return call
+
+
+def test_promote_moves_queued_bulk_request_ahead():
+    async def scenario():
+        scheduler = VTScheduler(requests_per_minute=600, requests_per_day=1000)
+        order = []
+        # Hold dispatching while the queue fills up
+        scheduler._paused_until = time.monotonic() + 0.2
+        tasks = [
+            asyncio.create_task(scheduler.submit(_call(order, name), priority=PRIORITY_BULK, key=name))
+            for name in ("a", "b", "c")
+        ]
+        await asyncio.sleep(0.05)
+        scheduler.promote("c", PRIORITY_INTERACTIVE)
+        assert scheduler.stats()["queue_depth_by_priority"] == {PRIORITY_BULK: 2, PRIORITY_INTERACTIVE: 1}
+
+        await asyncio.gather(*tasks)
+        await scheduler.close()
+        return order
+
+    assert asyncio.run(scenario()) == ["c", "a", "b"]
+
+
+def test_promote_ignores_lower_priority_and_unknown_keys():
+    async def scenario():
+        scheduler = VTScheduler(requests_per_minute=600, requests_per_day=1000)
+        order = []
+        scheduler._paused_until = time.monotonic() + 0.2
+        tasks = [
+            asyncio.create_task(scheduler.submit(_call(order, "a"), priority=PRIORITY_INTERACTIVE, key="a")),
+            asyncio.create_task(scheduler.submit(_call(order, "b"), priority=PRIORITY_INTERACTIVE, key="b")),
+        ]
+        await asyncio.sleep(0.05)
+        scheduler.promote("b", PRIORITY_BULK)
+        scheduler.promote("missing", PRIORITY_INTERACTIVE)
+
+        await asyncio.gather(*tasks)
+        await scheduler.close()
+        return order
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+
+
+def test_interactive_caller_promotes_in_flight_bulk_fetch(monkeypatch):
+    from app.services import virustotal_service
+
+    async def scenario():
+        release = asyncio.Event()
+        promoted = []
+
+        async def fake_fetch(ioc, priority):
+            await release.wait()
+            return {"ioc": ioc, "source": "virustotal", "summary": {}}
+
+        monkeypatch.setattr(virustotal_service, "_fetch_from_virustotal", fake_fetch)
+        monkeypatch.setattr(virustotal_service.vt_scheduler, "promote", lambda key, priority: promoted.append((key, priority)))
+
+        bulk = asyncio.create_task(virustotal_service.fetch_from_virustotal("8.8.8.8", PRIORITY_BULK))
+        await asyncio.sleep(0.05)
+        interactive = asyncio.create_task(virustotal_service.fetch_from_virustotal("8.8.8.8", PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0.05)
+        release.set()
+        results = await asyncio.gather(bulk, interactive)
+        return promoted, results, dict(virustotal_service._flight_priority)
+
+    promoted, results, remaining = asyncio.run(scenario())
+    assert promoted == [("8.8.8.8", PRIORITY_INTERACTIVE)]
+    assert results[0] == results[1]
+    assert remaining == {}
+
+
+def test_cancelled_requests_do_not_spend_tokens():
+    async def scenario():
+        scheduler = VTScheduler(requests_per_minute=600, requests_per_day=1000)
+        order = []
+        taken = []
+
+        async def take_token():
+            taken.append(1)
+            return 0.0
+
+        scheduler._take_token = take_token
+        scheduler._paused_until = time.monotonic() + 0.1
+        gone = asyncio.create_task(scheduler.submit(_call(order, "gone"), key="gone"))
+        await asyncio.sleep(0.02)
+        gone.cancel()
+        await asyncio.sleep(0.15)
+
+        await scheduler.submit(_call(order, "kept"), key="kept")
+        await scheduler.close()
+        return order, len(taken)
+
+    assert asyncio.run(scenario()) == (["kept"], 1)
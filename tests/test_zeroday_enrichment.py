@@ -0,0 +1,47 @@
+from app.services import embedded_search, zeroday_enrichment
+from app.services.embedded_search import EmbeddedSearchIndex, write_snapshot
+from app.services.zeroday_enrichment import build_zeroday_map, enrich_cve_index
+
+
+class FakeIndices:
+    def refresh(self, index):
+        pass
+
+
+class FakeES:
+    indices = FakeIndices()
+
+
+def test_build_zeroday_map_parses_free_text_cve_column():
+    records = [
+        {"zero_day_id": "VO-1", "cve": "CVE-2024-0001, cve-2024-0002", "category": "CAN", "impact": "High"},
+        {"zero_day_id": "VO-1", "cve": "CVE-2024-0001", "category": "CAN", "impact": "High"},
+        {"zero_day_id": "VO-2", "cve": "N/A", "category": "ECU", "impact": "Low"},
+    ]
+    entry = {"zero_day_id": "VO-1", "category": "CAN", "impact": "High"}
+    assert build_zeroday_map(records) == {"CVE-2024-0001": [entry], "CVE-2024-0002": [entry]}
+
+
+def test_enrichment_rebuilds_the_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedded_search.settings, "cve_snapshot_dir", str(tmp_path))
+    docs = {"CVE-2024-0001": {"name": "CVE-2024-0001", "description": "CAN bus overflow"}}
+    write_snapshot("asrg-cve", docs.values())
+
+    def fake_bulk(client, actions, **kwargs):
+        updated = 0
+        for action in actions:
+            docs[action["_id"]].update(action["doc"])
+            updated += 1
+        return updated, []
+
+    monkeypatch.setattr(zeroday_enrichment, "es", FakeES())
+    monkeypatch.setattr(zeroday_enrichment, "bump_index_generation", lambda index: None)
+    monkeypatch.setattr(zeroday_enrichment.helpers, "bulk", fake_bulk)
+    monkeypatch.setattr(embedded_search.helpers, "scan", lambda client, index, **kwargs: ({"_source": doc} for doc in docs.values()))
+
+    zeroday_map = build_zeroday_map([{"zero_day_id": "VO-1", "cve": "CVE-2024-0001", "category": "CAN", "impact": "High"}])
+    assert enrich_cve_index(zeroday_map) == {"updated": 1, "missing": 0}
+
+    index = EmbeddedSearchIndex("asrg-cve")
+    assert index.load()
+    assert index.get("CVE-2024-0001")["zero_day"] == [{"zero_day_id": "VO-1", "category": "CAN", "impact": "High"}]